@@ -1,11 +1,18 @@
+import asyncio
 import json
 import logging
 import os
-import shutil
-from tempfile import NamedTemporaryFile
 import base64
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+# Start of the cold-start clock, before the (slow) third-party imports below
+_boot_started = time.perf_counter()
+
 from bson.errors import InvalidId
 from bson.objectid import ObjectId
+from pymongo import InsertOne, UpdateOne
 from fastapi import (
     APIRouter,
     Depends,
@@ -18,111 +25,234 @@ from fastapi import (
     Path,
     Request,
 )
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, ValidationError
 from datetime import datetime
 from datetime import datetime
-
-from utils.database import get_collection_by_name, get_db_connection
-from llm.glovera_chat import OpenAIConversation
-from llm.openai_tts import generate_speech
+from dotenv import load_dotenv
+
+# Once, here, before the app modules read their settings at import
+load_dotenv()
+
+from utils.database import close_db_connection, get_collection_by_name, get_db_connection, get_programs_collection, pool_stats
+from utils import services
+from utils.program_catalog import MappedCatalog, get_catalog, run_catalog_refresher
+from utils import prefetch, session_cache
+from utils.write_behind import PERSIST_MODE, conversation_writes
+from utils import admission
+from utils.admission import ADMISSION_REJECT_STATUS, Overloaded
+from utils.metrics import HTTP_LATENCY, log_event, register_stats, render_metrics, stage, trace_id_var
+from llm.glovera_chat import OpenAIConversation, prefetch_profile_programs
+from llm.openai_tts import AUDIO_MEDIA_TYPES, generate_speech, stream_speech
+from llm.tts_cache import tts_cache
+from llm.query_cache import query_cache
 from llm.groq_stt import stt
+from llm.voice_pipeline import speak_stream
+from llm.context_window import fold_boundary, fold_into_summary
 from utils.models import User, TTSRequest, STTRequest
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-router = FastAPI()
+INITIAL_MESSAGE = (
+    "Hi, I am an AI consultant who'll help you find the best universities abroad. "
+    "Ask me anything about where you want to study, what you want to study, your budget, "
+    "or any other questions you might have.")
 
-# MongoDB collection
-db = get_db_connection()
-conversations_collection = get_collection_by_name(db, 'Conversation')
-users_collection = get_collection_by_name(db,'Profile')
+# How many of the most recent messages a chat turn reads from the Conversation document
+CONVERSATION_TAIL_MESSAGES = int(os.getenv('CONVERSATION_TAIL_MESSAGES', 40))
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', 20))
 
+# Keeps fire-and-forget tasks referenced until they finish
+_background_tasks = set()
 
-@router.post("/start_conversation/")
-async def start_conversation(
-    user_id: str = Form(...),
-    get_audio_response: bool = Form(False),
-):
-    response = {"success": False, "message": "", "data": None}
+# MongoDB collections, bound on startup
+conversations_collection = None
+users_collection = None
+
+
+async def _prewarm_greeting_audio(warm_up):
+    try:
+        # Let the SDK clients get built off the event loop first
+        await warm_up
+        await generate_speech(INITIAL_MESSAGE)
+        logger.info("Greeting audio pre-warmed")
+    except Exception as e:
+        logger.error(f"Greeting audio pre-warm failed: {str(e)}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global conversations_collection, users_collection
+    # Doesn't wait for Mongo: a blip at boot shows up in /ready instead of killing the worker
+    db = await get_db_connection()
+    conversations_collection = get_collection_by_name(db, 'Conversation')
+    users_collection = get_collection_by_name(db,'Profile')
+    # Everything slow happens after the worker is up: SDK imports, first Mongo connection,
+    # greeting audio (so the most common TTS request never goes upstream) and the catalog
+    warm_up = asyncio.create_task(services.warm_up())
+    prewarm = asyncio.create_task(_prewarm_greeting_audio(warm_up))
+    catalog_refresher = asyncio.create_task(run_catalog_refresher(get_programs_collection()))
+    query_cache_index = asyncio.create_task(query_cache.ensure_index())
+    if PERSIST_MODE == 'write_behind':
+        conversation_writes.start(conversations_collection)
+    services.mark_started(_boot_started)
+    yield
+    warm_up.cancel()
+    prewarm.cancel()
+    catalog_refresher.cancel()
+    query_cache_index.cancel()
+    prefetch.cancel_all()
+    await conversation_writes.stop()
+    await services.close()
+    close_db_connection()
+
+
+router = FastAPI(lifespan=lifespan)
+
+
+def _catalog_stats():
+    catalog = get_catalog()
+    return {"loaded": int(catalog is not None), "programs": len(catalog) if catalog is not None else 0}
+
+
+register_stats("glovera_db_pool", "MongoDB connection pool", pool_stats.snapshot)
+register_stats("glovera_tts_cache", "TTS audio cache", tts_cache.stats)
+register_stats("glovera_query_cache", "Query translation cache", query_cache.stats)
+register_stats("glovera_catalog", "In-process program catalog", _catalog_stats)
+register_stats("glovera_session_cache", "Conversation session cache", session_cache.stats)
+register_stats("glovera_write_behind", "Write-behind conversation queue", conversation_writes.stats)
+register_stats("glovera_admission", "Upstream admission control", admission.stats)
+register_stats("glovera_prefetch", "Speculative profile prefetch", prefetch.stats)
+
+
+@router.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    # Turned away by admission control: tell the client to come back instead of a generic 500
+    logger.warning(f"Rejected {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=ADMISSION_REJECT_STATUS,
+        content={"detail": f"Service busy, retry in {exc.retry_after}s"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@router.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Tags every request with a trace id (X-Request-ID, generated if absent) that all stage
+    logs carry, and records end-to-end latency per route template.
+    """
+    trace_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = trace_id_var.set(trace_id)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = trace_id
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        HTTP_LATENCY.labels(request.method, path, str(status_code)).observe(elapsed)
+        log_event("request", method=request.method, route=path, status=status_code,
+                  duration_ms=round(elapsed * 1000, 2))
+        trace_id_var.reset(token)
+
+
+async def _create_conversation(user_id):
     # print({"userId":ObjectId(user_id)})
-    user_info = users_collection.find_one({"userId":ObjectId(user_id)})
+    async with admission.mongo.slot():
+        with stage("mongo_profile_lookup"):
+            profile = await users_collection.find_one({"userId":ObjectId(user_id)})
     
-    if not user_info:
+    if not profile:
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-    user_info = dict([(i,user_info[i]) for i in user_info if i != '_id' and i != 'userId'])
+    user_info = dict([(i,profile[i]) for i in profile if i != '_id' and i != 'userId'])
     # print(user_info)
-    try:
-        # Initialize conversation
-        prompt_system = """You are an AI consultant to help users who want to study abroad.
-        Answer all their questions regarding courses, universities, eligibility, etc.
-
-        IMPORTANT: Remember you have a database of universities, their programs, fees and other info.
-        Give a short, concise and well formatted response in markdown format. Formatting is important and length is important. 
-        Don't bombard the user with a huge response, make it concise and engaging, just a summary.
-        """
-
-        prompt_system += f"Also, here is some additional information about the user to help you respond better {user_info}"
-
-        initial_message = (
-            "Hi, I am an AI consultant who'll help you find the best universities abroad. "
-            "Ask me anything about where you want to study, what you want to study, your budget, "
-            "or any other questions you might have.")
-
-        conversation = OpenAIConversation(
-            model=os.getenv('CONV_MODEL'), system_prompt=prompt_system
-        )
-
-        conversation = OpenAIConversation(model=os.getenv('CONV_MODEL'), system_prompt=prompt_system, user_data=user_info)
-        conversation.start_conversation(initial_message=initial_message)
-
-        # Create conversation document matching Prisma schema
-        conv_to_post = {
-            "userId": user_id,
-            "title": "Study Abroad Consultation",
-            "messages": [{
-                "role": "system",
-                "content": prompt_system,
-                "timestamp": str(datetime.utcnow())
-            }, {
-                "role": "assistant",
-                "content": initial_message,
-                "timestamp": str(datetime.utcnow())
-            }],
-            "createdAt": datetime.utcnow(),
-            "updatedAt": datetime.utcnow(),
-            "status": "active"
-        }
 
-        # Store in database
-        result = conversations_collection.insert_one(conv_to_post)
-        conversation_id = str(result.inserted_id)
+    # Initialize conversation
+    prompt_system = """You are an AI consultant to help users who want to study abroad.
+    Answer all their questions regarding courses, universities, eligibility, etc.
+
+    IMPORTANT: Remember you have a database of universities, their programs, fees and other info.
+    Give a short, concise and well formatted response in markdown format. Formatting is important and length is important. 
+    Don't bombard the user with a huge response, make it concise and engaging, just a summary.
+    """
+
+    prompt_system += f"Also, here is some additional information about the user to help you respond better {user_info}"
+
+    # Create conversation document matching Prisma schema
+    conv_to_post = {
+        "userId": user_id,
+        "title": "Study Abroad Consultation",
+        "messages": [{
+            "role": "system",
+            "content": prompt_system,
+            "timestamp": str(datetime.utcnow())
+        }, {
+            "role": "assistant",
+            "content": INITIAL_MESSAGE,
+            "timestamp": str(datetime.utcnow())
+        }],
+        "createdAt": datetime.utcnow(),
+        "updatedAt": datetime.utcnow(),
+        "status": "active"
+    }
+
+    # Store in database
+    conv_to_post["_id"] = ObjectId()
+    if not await conversation_writes.submit(InsertOne(conv_to_post)):
+        async with admission.mongo.slot():
+            with stage("mongo_insert_conversation"):
+                await conversations_collection.insert_one(conv_to_post)
+    conversation_id = str(conv_to_post["_id"])
+
+    # The first follow-up turn usually lands here within seconds, start it warm
+    session_cache.put_session(conversation_id, {
+        "_id": conv_to_post["_id"],
+        "userId": user_id,
+        "title": conv_to_post["title"],
+        "status": conv_to_post["status"],
+        "messages": list(conv_to_post["messages"]),
+        "messageCount": len(conv_to_post["messages"]),
+        "historyBase": 1,
+        "historyOffset": 0,
+    }, profile)
+    # Likewise the first database question is usually "what fits me", have that answer ready
+    prefetch.start(conversation_id, prefetch_profile_programs(user_info))
+    return conversation_id
+
+
+@router.post("/start_conversation/")
+async def start_conversation(
+    user_id: str = Form(...),
+    get_audio_response: bool = Form(False),
+):
+    response = {"success": False, "message": "", "data": None}
+    try:
+        conversation_id = await _create_conversation(user_id)
+        initial_message = INITIAL_MESSAGE
 
         # Generate audio if required
         if get_audio_response:
             try:
-                with NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
-                    audio_path = temp_file.name
-                    generate_speech(initial_message, output_file=audio_path)
-
-                    with open(audio_path, "rb") as audio_file:
-                        audio_bytes = base64.b64encode(
-                            audio_file.read()).decode("utf-8")
-
-                    os.unlink(audio_path)
-
-                    response["success"] = True
-                    response["message"] = "Conversation started successfully"
-                    response["data"] = {
-                        "conversation_id": conversation_id,
-                        "initial_message": initial_message,
-                        "audio_response": audio_bytes,
-                    }
-                    return response
+                audio = await generate_speech(initial_message)
+                audio_bytes = _b64encode(audio)
+
+                response["success"] = True
+                response["message"] = "Conversation started successfully"
+                response["data"] = {
+                    "conversation_id": conversation_id,
+                    "initial_message": initial_message,
+                    "audio_response": audio_bytes,
+                }
+                return response
 
             except Exception as e:
                 logger.error(f"Audio generation error: {str(e)}")
@@ -143,11 +273,198 @@ async def start_conversation(
         }
         return response
 
+    except Overloaded:
+        raise
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+def _parse_conversation_id(conversation_id):
+    # Validate conversation_id format
+    try:
+        return ObjectId(conversation_id)
+    except InvalidId:
+        raise HTTPException(
+            status_code=400, detail="Invalid conversation ID format")
+
+
+async def _find_conversation_with_profile(obj_id):
+    """
+    Loads a conversation with only its last CONVERSATION_TAIL_MESSAGES messages (plus the
+    system prompt), so reads stay the same size however long the chat gets, and joins the
+    user's Profile in the same round trip (as "profile").
+    """
+    async with admission.mongo.slot():
+        with stage("mongo_conversation_lookup"):
+            conversations = await conversations_collection.aggregate([
+                {"$match": {"_id": obj_id}},
+                {"$project": {
+                    "userId": 1,
+                    "title": 1,
+                    "status": 1,
+                    "summary": 1,
+                    "summarizedCount": 1,
+                    "messageCount": {"$size": {"$ifNull": ["$messages", []]}},
+                    "first": {"$arrayElemAt": ["$messages", 0]},
+                    "messages": {"$slice": [{"$ifNull": ["$messages", []]}, -CONVERSATION_TAIL_MESSAGES]},
+                }},
+                {"$lookup": {
+                    "from": "Profile",
+                    "let": {"uid": {"$convert": {"input": "$userId", "to": "objectId", "onError": None, "onNull": None}}},
+                    "pipeline": [{"$match": {"$expr": {"$eq": ["$userId", "$$uid"]}}}, {"$limit": 1}],
+                    "as": "profile",
+                }},
+            ]).to_list(1)
+    if not conversations:
+        return None, None
+
+    conversation = conversations[0]
+    profiles = conversation.pop("profile", [])
+    first = conversation.pop("first", None)
+    tail = conversation["messages"]
+    conversation["historyBase"] = 1 if first and first.get("role") == "system" else 0
+    if conversation["messageCount"] > len(tail):
+        # The tail starts mid-transcript, put the system prompt back in front of it
+        if conversation["historyBase"]:
+            conversation["messages"] = [first] + tail
+        conversation["historyOffset"] = conversation["messageCount"] - len(tail) - conversation["historyBase"]
+    else:
+        conversation["historyOffset"] = 0
+    return conversation, (profiles[0] if profiles else None)
+
+
+async def _load_conversation(conversation_id):
+    obj_id = _parse_conversation_id(conversation_id)
+
+    # Consecutive turns of an active session are served from the hot-session cache
+    session = session_cache.get_session(str(obj_id))
+    if session:
+        conversation, user_info = session
+        return obj_id, conversation, user_info
+
+    # Find the conversation
+    conversation, user_info = await _find_conversation_with_profile(obj_id)
+
+    if not conversation:
+        raise HTTPException(
+            status_code=404, detail="Conversation not found")
+
+    session_cache.put_session(str(obj_id), conversation, user_info)
+    return obj_id, conversation, user_info
+
+
+async def _transcribe_audio_base64(audio_base64):
+    try:
+        with stage("base64_decode", chars=len(audio_base64)):
+            content = base64.b64decode(audio_base64)
+        return await stt(content, lang="en", system="")
+    except Overloaded:
+        raise
+    except Exception as e:
+        logger.error(f"Audio processing error: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail="Failed to process audio input")
+
+
+async def _save_turn(obj_id, conversation, user_message, ai_response):
+    new_message = {
+        "role": "user",
+        "content": user_message,
+        "timestamp": str(datetime.utcnow())
+    }
+    ai_message = {
+        "role": "assistant",
+        "content": ai_response,
+        "timestamp": str(datetime.utcnow())
+    }
+    changes = {
+        "$push": {"messages": {"$each": [new_message, ai_message]}},
+        "$set": {"updatedAt": datetime.utcnow()}
+    }
+    # Matches nothing once this turn is in, so a retried write-behind flush can't push it twice
+    turn_filter = {"_id": obj_id, "messages.timestamp": {"$ne": new_message["timestamp"]}}
+    # In write-behind mode the $push is flushed in a batch, off the request path
+    if not await conversation_writes.submit(UpdateOne(turn_filter, changes)):
+        async with admission.mongo.slot():
+            with stage("mongo_push_turn"):
+                await conversations_collection.update_one(turn_filter, changes)
+    # Summary first: it needs the tail as it was before this turn
+    _schedule_summary(obj_id, conversation, [new_message, ai_message])
+    session_cache.append_messages(str(obj_id), [new_message, ai_message])
+
+
+def _schedule_summary(obj_id, conversation, new_messages):
+    # Fold turns that fell out of the context window into the rolling summary, off the request path
+    summary = conversation.get("summary")
+    summarized_count = conversation.get("summarizedCount", 0)
+    new_count = fold_boundary(
+        conversation["messages"] + new_messages, summary, summarized_count,
+        history_offset=conversation.get("historyOffset", 0))
+    if new_count is not None:
+        task = asyncio.create_task(_fold_summary(
+            obj_id, summary, summarized_count, new_count, conversation.get("historyBase", 1)))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+
+async def _fold_summary(obj_id, summary, summarized_count, new_count, history_base):
+    new_summary = await fold_into_summary(
+        conversations_collection, obj_id, summary, summarized_count, new_count, history_base=history_base)
+    if new_summary is not None:
+        session_cache.update_summary(str(obj_id), new_summary, new_count)
+
+
+def _b64encode(audio):
+    with stage("base64_encode", bytes=len(audio)):
+        return base64.b64encode(audio).decode("utf-8")
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _negotiate_audio_format(response_format, accept):
+    """
+    Picks the TTS output format from an explicit `response_format` field, falling back
+    to the Accept header (e.g. "audio/ogg" or "audio/opus" selects opus) and then mp3.
+    """
+    if response_format:
+        if response_format not in AUDIO_MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unsupported audio format: {response_format}")
+        return response_format
+    accept = (accept or "").lower()
+    if "opus" in accept or "audio/ogg" in accept:
+        return "opus"
+    for audio_format, media_type in AUDIO_MEDIA_TYPES.items():
+        if media_type.split(";")[0] in accept:
+            return audio_format
+    return "mp3"
+
+
+async def _multipart_audio_stream(boundary, payload, audio_chunks, media_type):
+    # JSON part first so the client can render the text while the audio part streams in
+    yield (
+        f"--{boundary}\r\nContent-Type: application/json\r\n\r\n{json.dumps(payload)}\r\n"
+        f"--{boundary}\r\nContent-Type: {media_type}\r\n\r\n"
+    ).encode("utf-8")
+    try:
+        async for chunk in audio_chunks:
+            yield chunk
+    except Exception as e:
+        logger.error(f"Speech streaming error: {str(e)}")
+    yield f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+
+def _multipart_audio_response(payload, text, audio_format):
+    boundary = uuid.uuid4().hex
+    media_type = AUDIO_MEDIA_TYPES[audio_format]
+    return StreamingResponse(
+        _multipart_audio_stream(boundary, payload, stream_speech(text, response_format=audio_format), media_type),
+        media_type=f"multipart/mixed; boundary={boundary}",
+    )
+
+
 @router.post("/continue_conversation/")
 async def continue_conversation(
     conversation_id: str = Form(...),
@@ -156,90 +473,37 @@ async def continue_conversation(
     audio_base64: str = Form(None),
 ):
     
-    temp_files = []
     try:
-        # Validate conversation_id format
-        try:
-            obj_id = ObjectId(conversation_id)
-        except InvalidId:
-            raise HTTPException(
-                status_code=400, detail="Invalid conversation ID format")
-
-        # Find the conversation
-        conversation = conversations_collection.find_one({
-            "_id": obj_id
-        })
-
-        user_id = conversation['userId']
-        user_info = users_collection.find_one({"userId":ObjectId(user_id)})
-
-        if not conversation:
-            raise HTTPException(
-                status_code=404, detail="Conversation not found")
+        obj_id, conversation, user_info = await _load_conversation(conversation_id)
 
         # Process audio input if provided
         user_message = message
         if audio_base64:
-            try:
-                with NamedTemporaryFile(suffix=".wav", delete=False) as temp_input:
-                    temp_files.append(temp_input.name)
-                    content = base64.b64decode(audio_base64)
-                    temp_input.write(content)
-                    temp_input.flush()
-                    user_message = stt(temp_input.name, lang="en", system="")
-            except Exception as e:
-                logger.error(f"Audio processing error: {str(e)}")
-                raise HTTPException(
-                    status_code=500, detail="Failed to process audio input")
-
-        # Add user message
-        new_message = {
-            "role": "user",
-            "content": user_message,
-            "timestamp": str(datetime.utcnow())
-        }
+            user_message = await _transcribe_audio_base64(audio_base64)
 
         # Get AI response
-        ai = OpenAIConversation(model=os.getenv('CONV_MODEL'),system_prompt="",user_data=user_info)
-        ai.set_conversation(conversation["messages"])
-        ai_response = ai.add_user_message(user_message)
-
-        # Add AI response message
-        ai_message = {
-            "role": "assistant",
-            "content": ai_response,
-            "timestamp": str(datetime.utcnow())
-        }
+        ai = OpenAIConversation(model=os.getenv('CONV_MODEL'),system_prompt="",user_data=user_info,conversation_id=str(obj_id))
+        ai.set_conversation(conversation["messages"], summary=conversation.get("summary"))
+        ai_response = await ai.add_user_message(user_message)
 
         # Update conversation
-        conversations_collection.update_one(
-            {"_id": obj_id},
-            {
-                "$push": {"messages": {"$each": [new_message, ai_message]}},
-                "$set": {"updatedAt": datetime.utcnow()}
-            }
-        )
+        await _save_turn(obj_id, conversation, user_message, ai_response)
 
         # Generate audio response if requested
         if get_audio_response:
             try:
-                with NamedTemporaryFile(suffix=".mp3", delete=False) as temp_output:
-                    temp_files.append(temp_output.name)
-                    generate_speech(ai_response, output_file=temp_output.name)
-
-                    with open(temp_output.name, "rb") as audio_file:
-                        audio_base64 = base64.b64encode(
-                            audio_file.read()).decode("utf-8")
-
-                    return {
-                        "success": True,
-                        "message": "Response generated successfully",
-                        "data": {
-                            "audio_base64": audio_base64,
-                            "user_message": user_message,
-                            "ai_response": ai_response
-                        }
+                audio = await generate_speech(ai_response)
+                audio_base64 = _b64encode(audio)
+
+                return {
+                    "success": True,
+                    "message": "Response generated successfully",
+                    "data": {
+                        "audio_base64": audio_base64,
+                        "user_message": user_message,
+                        "ai_response": ai_response
                     }
+                }
 
             except Exception as e:
                 logger.error(f"Speech generation error: {str(e)}")
@@ -261,18 +525,277 @@ async def continue_conversation(
             }
         }
 
+    except Overloaded:
+        raise
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-    finally:
-        # Cleanup temporary files
-        for temp_file in temp_files:
+
+@router.post("/start_conversation_audio/")
+async def start_conversation_audio(
+    request: Request,
+    user_id: str = Form(...),
+    response_format: str = Form(None),
+):
+    """
+    Binary variant of /start_conversation/ with get_audio_response=True: returns a
+    multipart/mixed body with a JSON part followed by the greeting audio part.
+    """
+    audio_format = _negotiate_audio_format(response_format, request.headers.get("accept"))
+    try:
+        conversation_id = await _create_conversation(user_id)
+    except Overloaded:
+        raise
+    except Exception as e:
+        logger.error(f"Error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    payload = {
+        "success": True,
+        "message": "Conversation started successfully",
+        "data": {
+            "conversation_id": conversation_id,
+            "initial_message": INITIAL_MESSAGE
+        }
+    }
+    return _multipart_audio_response(payload, INITIAL_MESSAGE, audio_format)
+
+
+@router.post("/continue_conversation_audio/")
+async def continue_conversation_audio(
+    request: Request,
+    conversation_id: str = Form(...),
+    message: str = Form(""),
+    audio: UploadFile = File(None),
+    response_format: str = Form(None),
+):
+    """
+    Binary variant of /continue_conversation/ with get_audio_response=True: takes the
+    user's audio as a multipart upload and returns a multipart/mixed body with the
+    JSON reply followed by the streamed audio part.
+    """
+    audio_format = _negotiate_audio_format(response_format, request.headers.get("accept"))
+    if not message and audio is None:
+        raise HTTPException(status_code=400, detail="Either message or audio is required")
+
+    try:
+        obj_id, conversation, user_info = await _load_conversation(conversation_id)
+
+        user_message = message
+        if audio is not None:
             try:
-                if os.path.exists(temp_file):
-                    os.unlink(temp_file)
+                content = await audio.read()
+                user_message = await stt(content, lang="en", system="", filename=audio.filename or "audio.wav")
+            except Overloaded:
+                raise
             except Exception as e:
-                logger.error(f"Failed to cleanup temporary file {temp_file}: {str(e)}")
+                logger.error(f"Audio processing error: {str(e)}")
+                raise HTTPException(
+                    status_code=500, detail="Failed to process audio input")
+
+        ai = OpenAIConversation(model=os.getenv('CONV_MODEL'),system_prompt="",user_data=user_info,conversation_id=str(obj_id))
+        ai.set_conversation(conversation["messages"], summary=conversation.get("summary"))
+        ai_response = await ai.add_user_message(user_message)
+
+        await _save_turn(obj_id, conversation, user_message, ai_response)
+
+    except (HTTPException, Overloaded):
+        raise
+    except Exception as e:
+        logger.error(f"Error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    payload = {
+        "success": True,
+        "message": "Response generated successfully",
+        "data": {
+            "user_message": user_message,
+            "ai_response": ai_response
+        }
+    }
+    return _multipart_audio_response(payload, ai_response, audio_format)
+
+
+@router.post("/continue_conversation_stream/")
+async def continue_conversation_stream(
+    conversation_id: str = Form(...),
+    message: str = Form(...),
+    audio_base64: str = Form(None),
+):
+    """
+    Streaming variant of /continue_conversation/: the assistant reply is sent as
+    server-sent events ("token" per chunk, then "done" with the full reply).
+    """
+    try:
+        obj_id, conversation, user_info = await _load_conversation(conversation_id)
+
+        user_message = message
+        if audio_base64:
+            user_message = await _transcribe_audio_base64(audio_base64)
+
+    except (HTTPException, Overloaded):
+        raise
+    except Exception as e:
+        logger.error(f"Error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    # Once the stream starts the status is sent, so turn the request away now if we can't serve it
+    admission.openai_chat.check()
+    ai = OpenAIConversation(model=os.getenv('CONV_MODEL'),system_prompt="",user_data=user_info,conversation_id=str(obj_id))
+    ai.set_conversation(conversation["messages"], summary=conversation.get("summary"))
+
+    async def event_stream():
+        yield _sse("user_message", {"user_message": user_message})
+        tokens = []
+        try:
+            async for token in ai.stream_user_message(user_message):
+                tokens.append(token)
+                yield _sse("token", {"content": token})
+
+            ai_response = "".join(tokens)
+            await _save_turn(obj_id, conversation, user_message, ai_response)
+            yield _sse("done", {"user_message": user_message, "ai_response": ai_response})
+
+        except Overloaded as e:
+            logger.warning(f"Streaming rejected: {str(e)}")
+            yield _sse("error", {"detail": "Service busy", "retry_after": e.retry_after})
+        except Exception as e:
+            logger.error(f"Streaming error: {str(e)}")
+            yield _sse("error", {"detail": "Internal server error"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/continue_conversation_voice/")
+async def continue_conversation_voice(
+    conversation_id: str = Form(...),
+    message: str = Form(...),
+    audio_base64: str = Form(None),
+    response_format: str = Form("mp3"),
+):
+    """
+    Voice variant of /continue_conversation_stream/: alongside the "token" events,
+    each finished sentence is synthesised while the reply is still being generated
+    and sent as an "audio" event (ordered by "index"). A sentence whose speech fails gets
+    an "audio_error" event instead, and the turn is saved either way.
+    """
+    audio_format = _negotiate_audio_format(response_format, None)
+    try:
+        obj_id, conversation, user_info = await _load_conversation(conversation_id)
+
+        user_message = message
+        if audio_base64:
+            user_message = await _transcribe_audio_base64(audio_base64)
+
+    except (HTTPException, Overloaded):
+        raise
+    except Exception as e:
+        logger.error(f"Error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    # Once the stream starts the status is sent, so turn the request away now if we can't serve it
+    admission.openai_chat.check()
+    admission.openai_tts.check()
+    ai = OpenAIConversation(model=os.getenv('CONV_MODEL'),system_prompt="",user_data=user_info,conversation_id=str(obj_id))
+    ai.set_conversation(conversation["messages"], summary=conversation.get("summary"))
+
+    async def event_stream():
+        yield _sse("user_message", {"user_message": user_message})
+        tokens = []
+        try:
+            async for event in speak_stream(ai.stream_user_message(user_message), response_format=audio_format):
+                if event[0] == "text":
+                    tokens.append(event[1])
+                    yield _sse("token", {"content": event[1]})
+                elif event[0] == "text_done":
+                    # Saved as soon as the reply text is complete, whatever happens to its audio
+                    ai_response = "".join(tokens)
+                    await _save_turn(obj_id, conversation, user_message, ai_response)
+                elif event[0] == "audio_error":
+                    # Same degradation as the blocking endpoint: the text stands without this audio
+                    _, index, sentence, error = event
+                    detail = {"index": index, "text": sentence, "detail": "Failed to generate audio"}
+                    if isinstance(error, Overloaded):
+                        detail["retry_after"] = error.retry_after
+                    yield _sse("audio_error", detail)
+                else:
+                    _, index, sentence, audio = event
+                    yield _sse("audio", {
+                        "index": index,
+                        "text": sentence,
+                        "audio_base64": _b64encode(audio),
+                    })
+
+            yield _sse("done", {"user_message": user_message, "ai_response": ai_response})
+
+        except Overloaded as e:
+            logger.warning(f"Voice streaming rejected: {str(e)}")
+            yield _sse("error", {"detail": "Service busy", "retry_after": e.retry_after})
+        except Exception as e:
+            logger.error(f"Voice streaming error: {str(e)}")
+            yield _sse("error", {"detail": "Internal server error"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/conversation/{conversation_id}/messages")
+async def conversation_history(
+    conversation_id: str = Path(...),
+    before: int = None,
+    page_size: int = HISTORY_PAGE_SIZE,
+):
+    """
+    Paginated transcript read, newest page first. `before` is the message index to page
+    back from (defaults to the end); follow `next_before` until it is null.
+    """
+    obj_id = _parse_conversation_id(conversation_id)
+    page_size = max(1, min(page_size, 100))
+    try:
+        async with admission.mongo.slot():
+            with stage("mongo_history_count"):
+                count = await conversations_collection.aggregate([
+                    {"$match": {"_id": obj_id}},
+                    {"$project": {"messageCount": {"$size": {"$ifNull": ["$messages", []]}}}},
+                ]).to_list(1)
+        if not count:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+
+        total = count[0]["messageCount"]
+        end = total if before is None else max(0, min(before, total))
+        start = max(0, end - page_size)
+        messages = []
+        if end > start:
+            async with admission.mongo.slot():
+                with stage("mongo_history_page"):
+                    page = await conversations_collection.find_one(
+                        {"_id": obj_id}, {"_id": 1, "messages": {"$slice": [start, end - start]}})
+            messages = page.get("messages", []) if page else []
+
+        return {
+            "success": True,
+            "message": "Conversation history fetched successfully",
+            "data": {
+                "messages": messages,
+                "start": start,
+                "total": total,
+                "next_before": start if start > 0 else None
+            }
+        }
+
+    except (HTTPException, Overloaded):
+        raise
+    except Exception as e:
+        logger.error(f"Error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
 
 
 @router.post("/standalone_tts")
@@ -284,25 +807,123 @@ async def tts(request: TTSRequest):
         if not request.text:
             raise HTTPException(status_code=400, detail="Text is required")
 
-        with NamedTemporaryFile(suffix=".mp3", delete=False) as temp_output:
-            output_file = temp_output.name
-            generate_speech(request.text, output_file=output_file)
-
-            with open(output_file, "rb") as audio_file:
-                audio_base64 = base64.b64encode(
-                    audio_file.read()).decode("utf-8")
+        audio = await generate_speech(request.text)
+        audio_base64 = _b64encode(audio)
 
-            response["success"] = True
-            response["message"] = "Text-to-speech conversion successful"
-            response["data"] = {"audio_base64": audio_base64}
-
-            os.unlink(output_file)
-            return response
+        response["success"] = True
+        response["message"] = "Text-to-speech conversion successful"
+        response["data"] = {"audio_base64": audio_base64}
+        return response
 
+    except Overloaded:
+        raise
     except Exception as e:
         logger.error(f"TTS generation error: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.post("/standalone_tts/audio")
+async def tts_audio(request: TTSRequest, http_request: Request, response_format: str = None):
+    """
+    Binary variant of /standalone_tts: streams the audio itself with its media type
+    instead of base64 inside JSON.
+    """
+    if not request.text:
+        raise HTTPException(status_code=400, detail="Text is required")
+    audio_format = _negotiate_audio_format(response_format, http_request.headers.get("accept"))
+    admission.openai_tts.check()
+
+    return StreamingResponse(
+        stream_speech(request.text, response_format=audio_format),
+        media_type=AUDIO_MEDIA_TYPES[audio_format],
+    )
+
+
+@router.post("/stt")
+async def speech_to_text(audio: UploadFile = File(...), lang: str = Form("en")):
+    """
+    Transcribes an uploaded audio file (wav, mp3, ogg/opus, webm, ...) without base64.
+    """
+    try:
+        content = await audio.read()
+        text = await stt(content, lang=lang, system="", filename=audio.filename or "audio.wav")
+        return {
+            "success": True,
+            "message": "Speech-to-text conversion successful",
+            "data": {"text": text}
+        }
+    except Overloaded:
+        raise
+    except Exception as e:
+        logger.error(f"STT error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to process audio input")
+
+
+@router.get("/db_pool_stats")
+async def db_pool_stats():
+    return pool_stats.snapshot()
+
+@router.get("/tts_cache_stats")
+async def tts_cache_stats():
+    return tts_cache.stats()
+
+@router.get("/query_cache_stats")
+async def query_cache_stats():
+    return query_cache.stats()
+
+@router.get("/catalog_stats")
+async def catalog_stats():
+    catalog = get_catalog()
+    if catalog is None:
+        return {"loaded": False}
+    return {
+        "loaded": True,
+        "programs": len(catalog),
+        "loaded_at": catalog.loaded_at,
+        "shared_file": catalog.file.path if isinstance(catalog, MappedCatalog) else None,
+    }
+
+@router.get("/session_cache_stats")
+async def session_cache_stats():
+    return session_cache.stats()
+
+@router.post("/session_cache/invalidate")
+async def invalidate_session_cache(conversation_id: str = Form(None), user_id: str = Form(None)):
+    """
+    Hook for other services (e.g. profile edits) to drop cached session state.
+    """
+    if conversation_id:
+        session_cache.invalidate_session(conversation_id)
+        prefetch.cancel(conversation_id)
+    if user_id:
+        session_cache.invalidate_profile(user_id)
+    return {"success": True}
+
+@router.get("/write_behind_stats")
+async def write_behind_stats():
+    return conversation_writes.stats()
+
+@router.get("/prefetch_stats")
+async def prefetch_stats():
+    return prefetch.stats()
+
+@router.get("/admission_stats")
+async def admission_stats():
+    return admission.stats()
+
+@router.get("/metrics")
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@router.get("/ready")
+async def ready():
+    """
+    Readiness, unlike /ping (liveness): whether this worker can serve conversations,
+    i.e. Mongo answers. Also reports whether the SDK clients are warm yet.
+    """
+    report = await services.readiness()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
 @router.get("/ping")
 async def ping():
     return {"message": "pong"}
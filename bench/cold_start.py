@@ -0,0 +1,61 @@
+"""
+Measures worker cold start: a fresh interpreter imports api.py and runs the lifespan
+startup, as uvicorn would, and the time until it could take requests is compared to
+STARTUP_BUDGET_SECONDS (exit code 1 when the median is over).
+
+    python -m bench.cold_start --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from utils.services import STARTUP_BUDGET_SECONDS
+
+_child = """
+import asyncio, json
+from api import router
+from utils import services
+
+async def main():
+    async with router.router.lifespan_context(router):
+        print(json.dumps({"startup_seconds": services.startup_seconds}), flush=True)
+
+asyncio.run(main())
+"""
+
+
+def measure_once(env):
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', _child], stdout=subprocess.PIPE, text=True, env=env)
+    line = process.stdout.readline()
+    # Wall time includes interpreter start, which startup_seconds (measured inside api.py) doesn't
+    wall = time.perf_counter() - started
+    process.wait()
+    if not line:
+        raise SystemExit(f"worker failed to start (exit code {process.returncode})")
+    return wall, json.loads(line)['startup_seconds']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET_SECONDS)
+    parser.add_argument('--mongo-uri', default='mongodb://127.0.0.1:27017/')
+    args = parser.parse_args()
+
+    env = dict(os.environ, MONGO_URI=args.mongo_uri)
+    runs = [measure_once(env) for _ in range(args.runs)]
+    wall = statistics.median(run[0] for run in runs)
+    startup = statistics.median(run[1] for run in runs)
+    print(f"cold start over {args.runs} runs: median {wall:.3f}s wall, {startup:.3f}s in api.py "
+          f"(max {max(run[0] for run in runs):.3f}s), budget {args.budget}s")
+    if wall > args.budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
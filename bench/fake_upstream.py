@@ -0,0 +1,190 @@
+"""
+Local stand-in for the OpenAI (chat completions, speech) and Groq (transcriptions) HTTP
+APIs with configurable latency, so the benchmark runs offline and reproducibly.
+
+    python -m bench.fake_upstream --port 8900 --latency-ms 400 --token-ms 20
+
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8900/v1 and
+GROQ_BASE_URL=http://127.0.0.1:8900 (bench.run does this for you).
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from bench.seed import LOCATIONS, SUBJECTS
+
+
+settings = {
+    'latency_ms': 400,       # time to first token of a chat completion
+    'token_ms': 20,          # time per generated token after the first
+    'reply_tokens': 80,      # length of a plain text answer
+    'tts_latency_ms': 250,   # time to first audio byte
+    'tts_bytes_per_char': 800,
+    'tts_chunk_ms': 5,       # pacing between 4KB audio chunks
+    'stt_latency_ms': 300,
+}
+
+# Start of the nudge llm.glovera_chat sends after tool results (llm.context_window.TOOL_RESULT_PREFIX),
+# not imported so this server does not need the app's API keys to start
+TOOL_RESULT_PREFIX = "Answer the user query"
+
+TRANSCRIPTS = (
+    "What are some good data science programs in Texas?",
+    "Show me cheaper MBA options in California",
+    "Which computer science masters fit my budget?",
+)
+
+app = FastAPI()
+
+
+def _sleep_ms(ms):
+    return asyncio.sleep(ms / 1000)
+
+
+def _message_text(message):
+    content = message.get('content') or ''
+    if isinstance(content, list):
+        content = ' '.join(part.get('text', '') for part in content if isinstance(part, dict))
+    return content
+
+
+def _matching(words, text):
+    text = text.lower()
+    return [word for word in words if word.lower() in text]
+
+
+def _db_query(text):
+    """The filter a db agent would write for `text`, built from the synthetic catalog vocabulary."""
+    clauses = []
+    subjects = _matching(SUBJECTS, text) or ['science']
+    clauses.append({'program_name': {'$regex': '|'.join(subjects), '$options': 'i'}})
+    states = _matching([location.split(', ')[1] for location in LOCATIONS], text)
+    if states:
+        clauses.append({'location': {'$regex': '|'.join(states), '$options': 'i'}})
+    return {'$and': clauses}
+
+
+def _tool_call(tools, text):
+    name = tools[0]['function']['name']
+    if name == 'search_programs':
+        arguments = {'keywords': _matching(SUBJECTS, text) or ['science']}
+    else:
+        arguments = {'natural_language_query': text}
+    return {'id': f'call_{uuid.uuid4().hex[:24]}', 'type': 'function',
+            'function': {'name': name, 'arguments': json.dumps(arguments)}}
+
+
+def _plan(body):
+    """Decides what the fake model answers: a tool call, a <query> for the db agent, or text."""
+    messages = body.get('messages') or []
+    last = _message_text(messages[-1]) if messages else ''
+    tools = body.get('tools')
+    if tools and messages and messages[-1].get('role') == 'user' and not last.startswith(TOOL_RESULT_PREFIX):
+        return None, _tool_call(tools, last)
+    if '<natural_language_query>' in last:
+        query = last.split('<natural_language_query>')[-1].split('</natural_language_query>')[0]
+        return f"<query>{json.dumps(_db_query(query))}</query>", None
+    words = ['Here', 'are', 'a', 'few', 'programs', 'that', 'match', 'your', 'profile.']
+    return ' '.join(words[i % len(words)] for i in range(settings['reply_tokens'])), None
+
+
+def _usage(body, completion_tokens):
+    prompt_chars = sum(len(_message_text(m)) for m in body.get('messages') or [])
+    prompt_tokens = prompt_chars // 4 + 1
+    return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'prompt_tokens_details': {'cached_tokens': 0}}
+
+
+def _chunk(completion_id, model, delta, finish_reason=None):
+    return {'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+            'model': model, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+
+
+async def _stream_completion(body, text, tool_call):
+    completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+    model = body.get('model', 'gpt-4o')
+    await _sleep_ms(settings['latency_ms'])
+    tokens = 1
+    if tool_call:
+        head = dict(tool_call, index=0, function={'name': tool_call['function']['name'], 'arguments': ''})
+        yield _chunk(completion_id, model, {'role': 'assistant', 'tool_calls': [head]})
+        arguments = tool_call['function']['arguments']
+        for start in range(0, len(arguments), 16):
+            piece = {'index': 0, 'function': {'arguments': arguments[start:start + 16]}}
+            yield _chunk(completion_id, model, {'tool_calls': [piece]})
+            tokens += 1
+        yield _chunk(completion_id, model, {}, 'tool_calls')
+    else:
+        for i, word in enumerate(text.split(' ')):
+            if i:
+                await _sleep_ms(settings['token_ms'])
+            yield _chunk(completion_id, model, {'content': word if i == 0 else ' ' + word})
+            tokens += 1
+        yield _chunk(completion_id, model, {}, 'stop')
+    if (body.get('stream_options') or {}).get('include_usage'):
+        yield {'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+               'model': model, 'choices': [], 'usage': _usage(body, tokens)}
+
+
+@app.post('/v1/chat/completions')
+async def chat_completions(request: Request):
+    body = await request.json()
+    text, tool_call = _plan(body)
+
+    if body.get('stream'):
+        async def events():
+            async for chunk in _stream_completion(body, text, tool_call):
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type='text/event-stream')
+
+    tokens = len(text.split(' ')) if text else 1
+    await _sleep_ms(settings['latency_ms'] + settings['token_ms'] * (tokens - 1))
+    message = {'role': 'assistant', 'content': text}
+    if tool_call:
+        message['tool_calls'] = [tool_call]
+    return {
+        'id': f'chatcmpl-{uuid.uuid4().hex}', 'object': 'chat.completion', 'created': int(time.time()),
+        'model': body.get('model', 'gpt-4o'),
+        'choices': [{'index': 0, 'message': message, 'finish_reason': 'tool_calls' if tool_call else 'stop'}],
+        'usage': _usage(body, tokens),
+    }
+
+
+@app.post('/v1/audio/speech')
+async def speech(request: Request):
+    body = await request.json()
+    size = max(1, len(body.get('input', ''))) * settings['tts_bytes_per_char']
+
+    async def audio():
+        await _sleep_ms(settings['tts_latency_ms'])
+        for start in range(0, size, 4096):
+            if start:
+                await _sleep_ms(settings['tts_chunk_ms'])
+            yield b'\xff' * min(4096, size - start)
+    return StreamingResponse(audio(), media_type='audio/mpeg')
+
+
+@app.post('/openai/v1/audio/transcriptions')
+async def transcriptions(request: Request):
+    audio = await request.body()
+    await _sleep_ms(settings['stt_latency_ms'])
+    return JSONResponse({'text': TRANSCRIPTS[len(audio) % len(TRANSCRIPTS)]})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    for key, value in settings.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=int, default=value)
+    args = parser.parse_args()
+    settings.update({key: getattr(args, key) for key in settings})
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
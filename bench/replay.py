@@ -0,0 +1,148 @@
+"""
+Replays a corpus of real conversations through the in-process app with upstream calls
+served from cassettes (llm/cassette.py), so runs differ only by our own code.
+
+    # pull conversations from production (read only) into a corpus file
+    python -m bench.replay export --source-uri "$PROD_MONGO_URI" --limit 200 --corpus corpus.jsonl
+    # play it once against the real providers to record the cassettes
+    python -m bench.replay run --corpus corpus.jsonl --mode record
+    # then replay as often as needed; --latency zero leaves only our own overhead
+    python -m bench.replay run --corpus corpus.jsonl --mode replay --latency zero
+
+Profiles are copied into the local benchmark MongoDB. Keep --concurrency the same for
+recording and replaying (1 by default): cache hits depend on the order of the turns, and
+a request that was never recorded fails with CassetteMiss and counts as an error.
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+from bson import json_util
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from pymongo import MongoClient
+
+from bench.run import Recorder, app_client, build_report, monitor_loop_lag, print_report
+from bench.seed import check_local_uri
+from utils.database import DB_NAME
+
+# Start of the nudge the chat engine stores after tool results, not a real user turn
+TOOL_RESULT_PREFIX = "Answer the user query"
+
+
+def export(source_uri, corpus, limit):
+    db = MongoClient(source_uri)[DB_NAME]
+    written = 0
+    with open(corpus, 'w') as f:
+        for conversation in db.Conversation.find({}, {'userId': 1, 'messages': 1}).sort('_id', -1):
+            turns = [
+                m['content'] for m in conversation.get('messages', [])
+                if m.get('role') == 'user' and not str(m.get('content') or '').startswith(TOOL_RESULT_PREFIX)
+            ]
+            profile = db.Profile.find_one({'userId': _object_id(conversation.get('userId'))}, {'_id': 0})
+            if not turns or not profile:
+                continue
+            f.write(json_util.dumps({'profile': profile, 'turns': turns}) + '\n')
+            written += 1
+            if written >= limit:
+                break
+    print(f"exported {written} conversations to {corpus}")
+
+
+def _object_id(value):
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return value
+
+
+def _load_corpus(path, mongo_uri):
+    with open(path) as f:
+        conversations = [json_util.loads(line) for line in f if line.strip()]
+    profiles = MongoClient(mongo_uri)[DB_NAME].Profile
+    for conversation in conversations:
+        profile = conversation['profile']
+        profiles.replace_one({'userId': profile['userId']}, profile, upsert=True)
+    return conversations
+
+
+async def _replay_conversation(client, recorder, conversation):
+    response = await recorder.call('start_conversation', client.post(
+        '/start_conversation/', data={'user_id': str(conversation['profile']['userId'])}))
+    if response is None:
+        return
+    conversation_id = response.json()['data']['conversation_id']
+    for turn in conversation['turns']:
+        await recorder.call('continue_conversation', client.post(
+            '/continue_conversation/', data={'conversation_id': conversation_id, 'message': turn}))
+
+
+async def run(args, conversations):
+    environment = {
+        'UPSTREAM_CASSETTE': args.mode,
+        'UPSTREAM_CASSETTE_DIR': args.cassette_dir,
+        'UPSTREAM_CASSETTE_LATENCY': args.latency,
+        'MONGO_URI': args.mongo_uri,
+        # A warm TTS disk cache would hide speech calls from the recording
+        'TTS_CACHE_DIR': tempfile.mkdtemp(prefix='bench_tts_'),
+        'QUERY_CACHE_PERSIST': '0',
+    }
+    if args.mode == 'replay':
+        # Never used for requests, the SDK clients only refuse to start without one
+        environment.update({'OPENAI_API_KEY': 'replay', 'GROQ_API_KEY': 'replay'})
+
+    recorder = Recorder()
+    lag = []
+    queue = asyncio.Queue()
+    for conversation in conversations:
+        queue.put_nowait(conversation)
+
+    async def worker():
+        while not queue.empty():
+            await _replay_conversation(client, recorder, queue.get_nowait())
+
+    async with app_client(args, environment) as client:
+        monitor = asyncio.create_task(monitor_loop_lag(lag))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        monitor.cancel()
+    return build_report(args, recorder, lag, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser('export')
+    export_parser.add_argument('--source-uri', required=True)
+    export_parser.add_argument('--corpus', default='corpus.jsonl')
+    export_parser.add_argument('--limit', type=int, default=200)
+
+    run_parser = commands.add_parser('run')
+    run_parser.add_argument('--corpus', default='corpus.jsonl')
+    run_parser.add_argument('--mode', choices=('record', 'replay'), default='replay')
+    run_parser.add_argument('--latency', choices=('original', 'zero'), default='original')
+    run_parser.add_argument('--cassette-dir', default='cassettes')
+    run_parser.add_argument('--mongo-uri', default='mongodb://127.0.0.1:27017/')
+    run_parser.add_argument('--concurrency', type=int, default=1)
+    run_parser.add_argument('--timeout', type=float, default=120)
+    run_parser.add_argument('--output', help='write the JSON report here')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export(args.source_uri, args.corpus, args.limit)
+        return
+
+    check_local_uri(args.mongo_uri, allow_remote=False)
+    report = asyncio.run(run(args, _load_corpus(args.corpus, args.mongo_uri)))
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
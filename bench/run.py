@@ -0,0 +1,249 @@
+"""
+Offline load test for the conversation API.
+
+    python -m bench.fake_upstream --port 8900 &
+    python -m bench.seed
+    python -m bench.run --concurrency 20 --duration 60 --output bench_output.json
+
+Each worker starts a conversation, sends --turns follow-ups (a share of them as audio
+with a spoken reply) and sometimes a standalone TTS request, until --duration is up.
+By default the app runs in this process behind httpx's ASGI transport, so the reported
+event-loop lag is the app's own; --url drives a separately started server instead
+(started with the same OPENAI_BASE_URL/GROQ_BASE_URL/MONGO_URI).
+
+With --baseline, the run fails (exit code 1) when any endpoint's p95 or the overall
+throughput is more than --max-regression worse than in the baseline report.
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import random
+import sys
+import time
+import wave
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+import httpx
+
+from bench.seed import LOCATIONS, SUBJECTS, benchmark_user_ids
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _summary(values):
+    return {
+        'p50': _percentile(values, 50),
+        'p95': _percentile(values, 95),
+        'p99': _percentile(values, 99),
+        'max': max(values) if values else None,
+    }
+
+
+def _silent_wav(seconds=1.0, rate=16000):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(b'\x00\x00' * int(seconds * rate))
+    return buffer.getvalue()
+
+
+class Recorder:
+    """Per-endpoint latencies and error counts of the calls made through `call`."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, name, request):
+        started = time.perf_counter()
+        try:
+            response = await request
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            response, ok = None, False
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if ok:
+            data = response.json().get('data') or {}
+            # The chat endpoints report upstream failures as an "Error: ..." reply with a 200
+            ok = not str(data.get('ai_response', '')).startswith('Error')
+        self.latencies[name].append(elapsed_ms)
+        if not ok:
+            self.errors[name] += 1
+        return response if ok else None
+
+
+async def monitor_loop_lag(samples, interval=0.01):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append((loop.time() - started - interval) * 1000)
+
+
+def _user_message(rng):
+    return f"Can you suggest {rng.choice(SUBJECTS)} programs in {rng.choice(LOCATIONS).split(', ')[1]}?"
+
+
+async def _worker(client, recorder, user_ids, args, rng, deadline, audio_base64):
+    while time.perf_counter() < deadline:
+        response = await recorder.call('start_conversation', client.post(
+            '/start_conversation/', data={'user_id': rng.choice(user_ids)}))
+        if response is None:
+            continue
+        conversation_id = response.json()['data']['conversation_id']
+
+        for _ in range(args.turns):
+            if time.perf_counter() >= deadline:
+                return
+            if rng.random() < args.audio_ratio:
+                await recorder.call('continue_conversation_audio', client.post('/continue_conversation/', data={
+                    'conversation_id': conversation_id, 'message': '(voice message)',
+                    'audio_base64': audio_base64, 'get_audio_response': 'true'}))
+            else:
+                await recorder.call('continue_conversation', client.post('/continue_conversation/', data={
+                    'conversation_id': conversation_id, 'message': _user_message(rng)}))
+
+        if rng.random() < args.tts_ratio:
+            text = f"Sample answer {rng.randrange(args.tts_texts)} about {rng.choice(SUBJECTS)} programs."
+            await recorder.call('standalone_tts', client.post('/standalone_tts', json={'text': text}))
+
+
+def fake_upstream_environment(args):
+    return {
+        'OPENAI_BASE_URL': f"{args.upstream}/v1",
+        'GROQ_BASE_URL': args.upstream,
+        'OPENAI_API_KEY': 'bench',
+        'GROQ_API_KEY': 'bench',
+        'MONGO_URI': args.mongo_uri,
+    }
+
+
+@asynccontextmanager
+async def app_client(args, environment):
+    timeout = httpx.Timeout(args.timeout)
+    if getattr(args, 'url', None):
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout) as client:
+            yield client
+        return
+
+    # Set before the app is imported: its clients read these at import time
+    os.environ.update(environment)
+    os.environ.setdefault('CONV_MODEL', 'gpt-4o')
+    from api import router
+
+    async with router.router.lifespan_context(router):
+        transport = httpx.ASGITransport(app=router)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=timeout) as client:
+            yield client
+
+
+async def run(args, user_ids):
+    recorder = Recorder()
+    lag = []
+    audio_base64 = base64.b64encode(_silent_wav()).decode('utf-8')
+    async with app_client(args, fake_upstream_environment(args)) as client:
+        monitor = asyncio.create_task(monitor_loop_lag(lag))
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            _worker(client, recorder, user_ids, args, random.Random(args.seed + i), deadline, audio_base64)
+            for i in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+        monitor.cancel()
+
+    return build_report(args, recorder, lag, elapsed)
+
+
+def build_report(args, recorder, lag, elapsed):
+    endpoints = {}
+    for name, latencies in sorted(recorder.latencies.items()):
+        endpoints[name] = dict(
+            _summary(latencies), requests=len(latencies), errors=recorder.errors[name],
+            throughput=len(latencies) / elapsed)
+    total = sum(len(latencies) for latencies in recorder.latencies.values())
+    return {
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        'elapsed_seconds': elapsed,
+        'requests': total,
+        'errors': sum(recorder.errors.values()),
+        'throughput': total / elapsed,
+        'endpoints': endpoints,
+        'loop_lag_ms': _summary(lag),
+    }
+
+
+def print_report(report):
+    print(f"{report['requests']} requests in {report['elapsed_seconds']:.1f}s "
+          f"({report['throughput']:.2f} req/s, {report['errors']} errors)")
+    print(f"{'endpoint':32} {'n':>6} {'err':>5} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, row in report['endpoints'].items():
+        print(f"{name:32} {row['requests']:>6} {row['errors']:>5} {row['throughput']:>8.2f} "
+              f"{row['p50']:>9.1f} {row['p95']:>9.1f} {row['p99']:>9.1f}")
+    lag = report['loop_lag_ms']
+    if lag['p50'] is not None:
+        print(f"event loop lag ms: p50 {lag['p50']:.2f} p99 {lag['p99']:.2f} max {lag['max']:.2f}")
+
+
+def _regressions(report, baseline, max_regression):
+    failures = []
+    for name, row in baseline['endpoints'].items():
+        current = report['endpoints'].get(name)
+        if current and row['p95'] and current['p95'] > row['p95'] * (1 + max_regression):
+            failures.append(f"{name} p95 {current['p95']:.1f}ms vs baseline {row['p95']:.1f}ms")
+    if report['throughput'] < baseline['throughput'] * (1 - max_regression):
+        failures.append(f"throughput {report['throughput']:.2f} vs baseline {baseline['throughput']:.2f} req/s")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='drive a running server instead of the in-process app')
+    parser.add_argument('--upstream', default='http://127.0.0.1:8900', help='bench.fake_upstream address')
+    parser.add_argument('--mongo-uri', default='mongodb://127.0.0.1:27017/')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--turns', type=int, default=3, help='follow-up turns per conversation')
+    parser.add_argument('--audio-ratio', type=float, default=0.3, help='share of turns sent as audio')
+    parser.add_argument('--tts-ratio', type=float, default=0.3, help='chance of a standalone TTS call per conversation')
+    parser.add_argument('--tts-texts', type=int, default=50, help='distinct standalone TTS texts')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='write the JSON report here')
+    parser.add_argument('--baseline', help='JSON report to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.15)
+    args = parser.parse_args()
+
+    user_ids = benchmark_user_ids(args.mongo_uri)
+    if not user_ids:
+        raise SystemExit("no benchmark profiles found, run `python -m bench.seed` first")
+
+    report = asyncio.run(run(args, user_ids))
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = _regressions(report, json.load(f), args.max_regression)
+        for failure in failures:
+            print(f"REGRESSION: {failure}")
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Loads a synthetic ProgramsGloveraFinal catalog and a set of benchmark Profiles into a
+local MongoDB, so the benchmark never touches real data.
+
+    python -m bench.seed --mongo-uri mongodb://127.0.0.1:27017/ --programs 5000 --profiles 200
+"""
+import argparse
+import random
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from pymongo import MongoClient
+from pymongo.uri_parser import parse_uri
+
+from utils.database import DB_NAME
+
+
+SUBJECTS = (
+    'computer science', 'data science', 'business administration', 'finance', 'marketing',
+    'mechanical engineering', 'electrical engineering', 'civil engineering', 'sociology',
+    'psychology', 'public health', 'information technology', 'economics', 'biotechnology',
+    'supply chain management', 'artificial intelligence', 'cybersecurity', 'accounting',
+)
+DEGREES = (('MS', 'Master of Science in'), ('MBA', 'MBA in'), ('MA', 'Master of Arts in'), ('MEng', 'Master of Engineering in'))
+LOCATIONS = (
+    'Boston, Massachusetts', 'Austin, Texas', 'Dallas, Texas', 'San Jose, California',
+    'Los Angeles, California', 'Chicago, Illinois', 'New York, New York', 'Seattle, Washington',
+    'Atlanta, Georgia', 'Pittsburgh, Pennsylvania', 'Phoenix, Arizona', 'Denver, Colorado',
+)
+JOB_ROLES = (
+    'Software Engineer', 'Data Analyst', 'Product Manager', 'Financial Analyst', 'Consultant',
+    'Research Scientist', 'Operations Manager', 'Marketing Manager', 'Project Engineer',
+)
+
+
+def synthetic_program(rng, i):
+    short, long = rng.choice(DEGREES)
+    subject = rng.choice(SUBJECTS)
+    original = round(rng.uniform(15000, 90000), 2)
+    savings = round(rng.uniform(0, 35), 1)
+    return {
+        'ranking': i + 1,
+        'program_name': f'{long} {subject.title()}',
+        'university_name': f'Bench University {i % 400}',
+        'location': rng.choice(LOCATIONS),
+        'glovera_pricing': round(original * (1 - savings / 100), 2),
+        'original_pricing': original,
+        'savings_percent': savings,
+        'public_private': rng.choice(('public', 'private')),
+        'key_job_roles': ', '.join(rng.sample(JOB_ROLES, 3)),
+        'type_of_program': short,
+        'quant_or_qualitative': rng.choice(('quantitative', 'qualitative')),
+        'min_gpa': round(rng.uniform(2.5, 3.6), 1),
+    }
+
+
+def synthetic_profile(rng):
+    low = rng.choice((10000, 20000, 30000))
+    return {
+        'userId': ObjectId(),
+        'name': 'Bench User',
+        'budget_range': f'{low}-{low + rng.choice((20000, 40000, 60000))}',
+        'gpa': round(rng.uniform(2.8, 4.0), 1),
+        'preferred_subject': rng.choice(SUBJECTS),
+        'benchmark': True,
+        'createdAt': datetime.utcnow(),
+    }
+
+
+def check_local_uri(uri, allow_remote):
+    hosts = [host for host, _ in parse_uri(uri)['nodelist']]
+    if not allow_remote and any(host not in ('localhost', '127.0.0.1', '::1') for host in hosts):
+        raise SystemExit(f"refusing to seed non-local MongoDB {hosts}, pass --allow-remote to override")
+
+
+def seed(uri, programs=5000, profiles=200, seed=7, allow_remote=False):
+    check_local_uri(uri, allow_remote)
+    rng = random.Random(seed)
+    db = MongoClient(uri)[DB_NAME]
+
+    db.ProgramsGloveraFinal.drop()
+    db.ProgramsGloveraFinal.insert_many([synthetic_program(rng, i) for i in range(programs)])
+    db.Profile.delete_many({'benchmark': True})
+    db.Profile.insert_many([synthetic_profile(rng) for _ in range(profiles)])
+    db.Profile.create_index('userId')
+
+
+def benchmark_user_ids(uri, limit=0):
+    db = MongoClient(uri)[DB_NAME]
+    cursor = db.Profile.find({'benchmark': True}, {'userId': 1}).limit(limit)
+    return [str(doc['userId']) for doc in cursor]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongo-uri', default='mongodb://127.0.0.1:27017/')
+    parser.add_argument('--programs', type=int, default=5000)
+    parser.add_argument('--profiles', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--allow-remote', action='store_true')
+    args = parser.parse_args()
+    seed(args.mongo_uri, args.programs, args.profiles, args.seed, args.allow_remote)
+    print(f"seeded {args.programs} programs and {args.profiles} profiles into {DB_NAME}")
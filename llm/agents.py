@@ -1,12 +1,7 @@
-from dotenv import load_dotenv
-from openai import OpenAI
+from utils import admission, services
+from utils.metrics import record_usage, stage
 
 
-load_dotenv()
-
-
-client = OpenAI()
-
 examples = """Examples of queries:\n
 1. Tell me about some good universities in the USA that teach sociology =>
                 {
@@ -33,7 +28,7 @@ examples = """Examples of queries:\n
 }
 Focus on creating flexible queries that can match relevant information even with variations in naming or formatting."""
 
-def ask_db_agent(query, user_data = None):
+async def ask_db_agent(query, user_data = None):
     prompt = (f"""You are a helpful AI agent/assistant.
 You will be provided with a natural language query and\n
 and you have to generate a mongodb query that is relevant to the natural language one, use the examples below to learn\n{examples}.
@@ -62,6 +57,8 @@ keywords associated with masters in program_name are ms | masters etc
 """)
     
     if user_data:
+        # Work on a copy, the caller's profile dict is reused across turns
+        user_data = dict(user_data)
         user_data['max_budet'] = user_data['budget_range'].split('-')[-1]
         del user_data['budget_range']
         '''print(user_data)
@@ -75,13 +72,15 @@ keywords associated with masters in program_name are ms | masters etc
     #print(prompt)
 
 
-    response = client.chat.completions.create(
+    async with admission.openai_chat.slot():
+        with stage("ask_db_agent", model='gpt-4o') as fields:
+            response = await services.openai_client().chat.completions.create(
                 model='gpt-4o',
-            
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0,
                 max_tokens=2000,
             )
+            record_usage("ask_db_agent", 'gpt-4o', response.usage, fields)
 
     choice = response.choices[-1]
     reply = choice.message.content
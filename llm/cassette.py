@@ -0,0 +1,161 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# off | record | replay
+UPSTREAM_CASSETTE = os.getenv('UPSTREAM_CASSETTE', 'off')
+UPSTREAM_CASSETTE_DIR = os.getenv('UPSTREAM_CASSETTE_DIR', 'cassettes')
+# original: replay with the recorded time to headers and chunk cadence, zero: as fast as possible
+UPSTREAM_CASSETTE_LATENCY = os.getenv('UPSTREAM_CASSETTE_LATENCY', 'original')
+
+# Response headers worth keeping, the rest (dates, request ids, rate limit counters) only add noise
+_kept_headers = ('content-type', 'content-encoding')
+
+
+class CassetteMiss(httpx.TransportError):
+    pass
+
+
+def request_key(request, body):
+    """
+    Identifies a request by method, path and body. JSON bodies are compared key-order
+    independently and the random multipart boundary is ignored.
+    """
+    content_type = request.headers.get('content-type', '')
+    if content_type.startswith('application/json'):
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True).encode('utf-8')
+        except ValueError:
+            pass
+    elif 'boundary=' in content_type:
+        body = body.replace(content_type.split('boundary=')[-1].encode('utf-8'), b'')
+    digest = hashlib.sha256(body).hexdigest()
+    return f"{request.method} {request.url.path} {digest}"
+
+
+class _RecordingStream(httpx.AsyncByteStream):
+    def __init__(self, cassette, entry, stream, started):
+        self.cassette = cassette
+        self.entry = entry
+        self.stream = stream
+        self.started = started
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            offset = round((time.perf_counter() - self.started) * 1000, 2)
+            self.entry['chunks'].append([offset, base64.b64encode(chunk).decode('ascii')])
+            yield chunk
+
+    async def aclose(self):
+        await self.stream.aclose()
+        await asyncio.to_thread(self.cassette.append, self.entry)
+
+
+class _ReplayStream(httpx.AsyncByteStream):
+    def __init__(self, chunks, started, zero_latency):
+        self.chunks = chunks
+        self.started = started
+        self.zero_latency = zero_latency
+
+    async def __aiter__(self):
+        for offset, data in self.chunks:
+            if not self.zero_latency:
+                delay = offset / 1000 - (time.perf_counter() - self.started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield base64.b64decode(data)
+
+
+class CassetteTransport(httpx.AsyncBaseTransport):
+    """
+    Records upstream request/response pairs, with time to headers and the arrival time of
+    every body chunk, to a JSON lines file, or replays them from it. Identical requests
+    are replayed in the order they were recorded; the last recording repeats after that.
+    """
+
+    def __init__(self, path, mode, latency='original', inner=None):
+        self.path = path
+        self.mode = mode
+        self.zero_latency = latency == 'zero'
+        self.inner = inner or httpx.AsyncHTTPTransport()
+        self._lock = threading.Lock()
+        self._recorded = defaultdict(list)
+        self._played = defaultdict(int)
+        if mode == 'replay':
+            self._load()
+
+    def _load(self):
+        with open(self.path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._recorded[entry['key']].append(entry)
+        logger.info(f"cassette {self.path}: {sum(map(len, self._recorded.values()))} interactions")
+
+    def append(self, entry):
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+    async def handle_async_request(self, request):
+        body = await request.aread()
+        key = request_key(request, body)
+        started = time.perf_counter()
+
+        if self.mode == 'replay':
+            entries = self._recorded.get(key)
+            if not entries:
+                raise CassetteMiss(f"no recording for {request.method} {request.url.path}", request=request)
+            entry = entries[min(self._played[key], len(entries) - 1)]
+            self._played[key] += 1
+            if not self.zero_latency:
+                await asyncio.sleep(entry['headers_ms'] / 1000)
+            return httpx.Response(
+                entry['status'], headers=entry['headers'],
+                stream=_ReplayStream(entry['chunks'], started, self.zero_latency), request=request)
+
+        response = await self.inner.handle_async_request(request)
+        entry = {
+            'key': key,
+            'method': request.method,
+            'path': request.url.path,
+            'status': response.status_code,
+            'headers': {k: v for k, v in response.headers.items() if k.lower() in _kept_headers},
+            'headers_ms': round((time.perf_counter() - started) * 1000, 2),
+            'chunks': [],
+        }
+        return httpx.Response(
+            response.status_code, headers=response.headers,
+            stream=_RecordingStream(self, entry, response.stream, started),
+            extensions=response.extensions, request=request)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+_transports = {}
+
+
+def http_client(upstream, client_class):
+    """
+    The http_client to build an upstream SDK client with: None (the SDK default) unless
+    UPSTREAM_CASSETTE is set, else a client_class using the shared cassette transport
+    for `upstream`, recorded in UPSTREAM_CASSETTE_DIR/<upstream>.jsonl.
+    """
+    if UPSTREAM_CASSETTE == 'off':
+        return None
+    if upstream not in _transports:
+        os.makedirs(UPSTREAM_CASSETTE_DIR, exist_ok=True)
+        path = os.path.join(UPSTREAM_CASSETTE_DIR, f'{upstream}.jsonl')
+        _transports[upstream] = CassetteTransport(path, UPSTREAM_CASSETTE, UPSTREAM_CASSETTE_LATENCY)
+    return client_class(transport=_transports[upstream])
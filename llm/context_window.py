@@ -0,0 +1,171 @@
+import logging
+import os
+
+from utils import admission, services
+from utils.metrics import record_usage, stage
+from utils.program_retrieval import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 3000))
+CONTEXT_MAX_TURNS = int(os.getenv('CONTEXT_MAX_TURNS', 6))
+SUMMARY_MODEL = os.getenv('SUMMARY_MODEL', 'gpt-4o-mini')
+# Don't pay for a summarisation call until at least this many messages fell out of the window
+SUMMARY_MIN_MESSAGES = int(os.getenv('SUMMARY_MIN_MESSAGES', 4))
+
+# handle_function_call feeds database results back as a user message starting with this
+TOOL_RESULT_PREFIX = "Answer the user query"
+
+_api_fields = ('role', 'content', 'tool_calls', 'tool_call_id', 'name')
+
+
+def is_tool_result(message):
+    if message['role'] == 'tool':
+        return True
+    if message['role'] == 'assistant' and message.get('tool_calls'):
+        return True
+    return message['role'] == 'user' and str(message.get('content') or '').startswith(TOOL_RESULT_PREFIX)
+
+
+def message_tokens(message):
+    return estimate_tokens(str(message.get('content') or '')) + 4
+
+
+def _clean(message):
+    # Drop timestamps and anything else the chat API doesn't need
+    return {k: message[k] for k in _api_fields if message.get(k) is not None}
+
+
+def _split(messages):
+    system = next((m for m in messages if m['role'] == 'system'), None)
+    history = [m for m in messages if m['role'] != 'system']
+    return system, history
+
+
+def window_start(history, budget, max_turns=CONTEXT_MAX_TURNS):
+    """
+    Index in `history` where the outgoing window begins: the last `max_turns` user turns
+    that fit in `budget` tokens. The window never starts in the middle of a turn and
+    always holds at least the latest one.
+    """
+    start = len(history)
+    last_user = _last_user_index(history)
+    used = 0
+    turns = 0
+    for i in range(len(history) - 1, -1, -1):
+        message = history[i]
+        if is_tool_result(message) and i < last_user:
+            continue
+        used += message_tokens(message)
+        if used > budget and start < len(history):
+            return start
+        if i == 0 or (message['role'] == 'user' and not is_tool_result(message)):
+            turns += 1
+            start = i
+            if turns >= max_turns:
+                return start
+    return start
+
+
+def _last_user_index(history):
+    for i in range(len(history) - 1, -1, -1):
+        if history[i]['role'] == 'user' and not is_tool_result(history[i]):
+            return i
+    return -1
+
+
+def _summary_message(summary):
+    return {"role": "system", "content": f"Summary of the earlier conversation: {summary}"}
+
+
+def _history_budget(system, summary, budget):
+    # Whatever the system prompt and the summary leave over goes to recent turns
+    if system:
+        budget -= message_tokens(system)
+    if summary:
+        budget -= message_tokens(_summary_message(summary))
+    return budget
+
+
+def build_context(messages, summary=None, budget=CONTEXT_TOKEN_BUDGET, max_turns=CONTEXT_MAX_TURNS):
+    """
+    Outgoing chat context: the system prompt, the rolling summary of older turns, and
+    the most recent turns within `budget` tokens. Database dumps from earlier turns
+    are dropped; only the current turn's tool results are kept.
+    """
+    system, history = _split(messages)
+    context = []
+    if system:
+        context.append(_clean(system))
+    if summary:
+        context.append(_summary_message(summary))
+
+    start = window_start(history, _history_budget(system, summary, budget), max_turns)
+    last_user = _last_user_index(history)
+    for i, message in enumerate(history[start:], start=start):
+        if is_tool_result(message) and i < last_user:
+            continue
+        context.append(_clean(message))
+    return context
+
+
+def fold_boundary(messages, summary, summarized_count, history_offset=0, budget=CONTEXT_TOKEN_BUDGET, max_turns=CONTEXT_MAX_TURNS):
+    """
+    History index the summary should be advanced to once the window has moved at least
+    SUMMARY_MIN_MESSAGES past `summarized_count`, else None. `messages` may be just the tail
+    of the transcript; `history_offset` is the history index of its first non-system message.
+    """
+    system, history = _split(messages)
+    start = history_offset + window_start(history, _history_budget(system, summary, budget), max_turns)
+    if start - summarized_count < SUMMARY_MIN_MESSAGES:
+        return None
+    return start
+
+
+async def summarize(previous_summary, messages):
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = (
+        "You maintain a running summary of a conversation between a student and a study-abroad consultant.\n"
+        "Update the summary with the new messages. Keep the student's goals, constraints (budget, GPA, location, "
+        "program type), programs already discussed and any decisions. At most 150 words, no preamble.\n"
+        f"<summary>{previous_summary or ''}</summary>\n<new_messages>\n{transcript}\n</new_messages>"
+    )
+    async with admission.openai_chat.slot():
+        with stage("summarize", model=SUMMARY_MODEL) as fields:
+            response = await services.openai_client().chat.completions.create(
+                model=SUMMARY_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0,
+                max_tokens=300,
+            )
+            record_usage("summarize", SUMMARY_MODEL, response.usage, fields)
+    return response.choices[-1].message.content
+
+
+async def fold_into_summary(collection, obj_id, previous_summary, summarized_count, new_count, history_base=1):
+    """
+    Summarises history messages [summarized_count, new_count) into the conversation's
+    rolling summary and stores it, unless another turn already advanced the summary in
+    the meantime. `history_base` is 1 when messages[0] is the system prompt. Returns the
+    new summary, or None when nothing was stored.
+    """
+    try:
+        with stage("mongo_summary_range"):
+            doc = await collection.find_one(
+                {"_id": obj_id},
+                {"_id": 1, "messages": {"$slice": [summarized_count + history_base, new_count - summarized_count]}},
+            )
+        fold = [m for m in (doc or {}).get("messages", []) if m['role'] != 'system' and not is_tool_result(m)]
+        if not fold:
+            return None
+        summary = await summarize(previous_summary, fold)
+        # A missing summarizedCount means nothing has been folded yet
+        expected = {"$in": [0, None]} if summarized_count == 0 else summarized_count
+        result = await collection.update_one(
+            {"_id": obj_id, "summarizedCount": expected},
+            {"$set": {"summary": summary, "summarizedCount": new_count}},
+        )
+        return summary if result.modified_count else None
+    except Exception as e:
+        logger.error(f"Conversation summary failed for {obj_id}: {e}")
+        return None
@@ -1,38 +1,161 @@
-from dotenv import load_dotenv
-from openai import OpenAI
 from enum import Enum
 import json
-from utils.database import get_programs_collection
-import pandas as pd
+import asyncio
+import logging
+import time
+from utils.program_retrieval import render_programs, retrieve_programs, search_catalog
+from utils.program_search import is_generic_question
+from utils import prefetch
 import os
-from utils.agent_tools import query_df_desc, query_mongo_db_desc  # Assuming this is a function descriptor
 from llm.agents import ask_db_agent
+from llm.query_cache import filter_relevant_user_fields, query_cache
+from llm.context_window import TOOL_RESULT_PREFIX, build_context
+from utils.query_builder import InvalidToolArguments, compile_filter, upper_bound
+from utils import admission, services
+from utils.admission import Overloaded
+from utils.metrics import record_usage, stage
+
+logger = logging.getLogger(__name__)
 
 class Role(Enum):
     SYSTEM = "system"
     USER = "user"
     ASSISTANT = "assistant"
+    TOOL = "tool"
+
+
+# Upper bound on database tool calls one turn runs at once; worker-wide limits are utils/admission's
+TOOL_CONCURRENCY = int(os.getenv('TOOL_CONCURRENCY', 4))
 
-load_dotenv()
-client = OpenAI()
+# 'agent' has ask_db_agent write a Mongo filter for every question, 'bm25' answers from a
+# local relevance search first (profile budget/GPA applied) and only asks the agent when
+# nothing matches or a sort other than ranking was requested
+ASK_DATABASE_ENGINE = os.getenv('ASK_DATABASE_ENGINE', 'agent')
 
     
-def ask_database(natural_language_query, user_data):
-    natural2mongo = ask_db_agent(natural_language_query, user_data)
-    natural2mongo = json.loads(natural2mongo)
-    print("query: ",natural2mongo)
+def _max_budget(user_data):
+    try:
+        return float(filter_relevant_user_fields(user_data)['max_budget'])
+    except (KeyError, ValueError):
+        return None
+
+
+def _gpa(user_data):
     try:
-        # Connect to MongoDB
-        collection = get_programs_collection()
+        return float(filter_relevant_user_fields(user_data)['gpa'])
+    except (KeyError, ValueError):
+        return None
+
+
+def _profile_defaults(user_data):
+    defaults = {}
+    max_budget = _max_budget(user_data)
+    if max_budget is not None:
+        defaults['max_budget'] = max_budget
+    gpa = _gpa(user_data)
+    if gpa is not None:
+        defaults['gpa'] = gpa
+    return defaults
+
+
+def _profile_filter(user_data):
+    # Profile values the search can't use (e.g. a percentage GPA) are left out
+    return compile_filter({}, _profile_defaults(user_data))
+
+
+def _fit_limits(query_filter, user_data):
+    """
+    Budget and GPA to rank by fit against: the limits the filter itself sets (the question's
+    or the tool's), the profile's otherwise.
+    """
+    profile_filter = _profile_filter(user_data)
+    limits = []
+    for field in ('glovera_pricing', 'min_gpa'):
+        limit = upper_bound(query_filter, field)
+        limits.append(upper_bound(profile_filter, field) if limit is None else limit)
+    return tuple(limits)
+
+
+def _default_sort(user_data):
+    # With a budget or GPA on the profile, rank by fit to it rather than by raw ranking
+    return "fit" if _profile_filter(user_data) else "ranking"
+
+
+async def prefetch_profile_programs(user_data):
+    """
+    Speculative answer to "which programs fit me": the programs within the profile's
+    budget and GPA, best fit first. Kept per conversation by utils/prefetch.py.
+    """
+    profile_filter = _profile_filter(user_data)
+    if not profile_filter:
+        return None
+    max_budget, gpa = _fit_limits(profile_filter, user_data)
+    total, programs = await retrieve_programs(profile_filter, sort_by="fit", max_budget=max_budget, gpa=gpa)
+    return {"filter": profile_filter, "result": render_programs(total, programs, sort_by="fit")}
+
+
+async def _prefetched_answer(conversation_id, query_filter):
+    """The prefetched result when `query_filter` is exactly the profile filter it was built for."""
+    if conversation_id is None:
+        return None
+    prefetched = await prefetch.get(conversation_id)
+    if prefetched is None:
+        return None
+    # A profile edited since the prefetch gives a different filter and is not served stale
+    served = prefetched["filter"] == query_filter
+    prefetch.record(served)
+    return prefetched["result"] if served else None
 
-        # Execute the query
-        filtered_docs = list(collection.find(natural2mongo))
-        if len(filtered_docs) > 1:
-            filtered_docs = filtered_docs[0]
-        tot = len(filtered_docs)
 
-        return f"Found {tot} documents, data: {filtered_docs}"
+async def ask_database(natural_language_query, user_data, sort_by=None, conversation_id=None):
+    if sort_by in (None, 'fit') and is_generic_question(natural_language_query):
+        answer = await _prefetched_answer(conversation_id, _profile_filter(user_data))
+        if answer is not None:
+            logger.info(f"prefetched: {natural_language_query!r}")
+            return answer
+
+    if ASK_DATABASE_ENGINE == 'bm25' and sort_by in (None, 'ranking'):
+        found = search_catalog(natural_language_query, _profile_filter(user_data))
+        if found is not None and found[0]:
+            logger.info(f"search: {natural_language_query!r} matched {found[0]} programs")
+            return render_programs(*found, sort_by="relevance")
+
+    sort_by = sort_by or _default_sort(user_data)
+    natural2mongo = await query_cache.get_or_translate(natural_language_query, user_data, ask_db_agent)
+    natural2mongo = json.loads(natural2mongo)
+    logger.info(f"query: {natural2mongo}")
+    try:
+        max_budget, gpa = _fit_limits(natural2mongo, user_data)
+        total, programs = await retrieve_programs(natural2mongo, sort_by=sort_by, max_budget=max_budget, gpa=gpa)
+        return render_programs(total, programs, sort_by=sort_by)
     
+    except Overloaded:
+        raise
+    except Exception as e:
+        return f"Error in query_mongo_db: {e}"
+
+async def search_programs(arguments, user_data, conversation_id=None):
+    """
+    Single-hop alternative to ask_database: the model passes structured filters which are
+    validated and compiled locally, so there is no extra LLM call to write the query.
+    """
+    sort_by = arguments.get('sort_by') or _default_sort(user_data)
+    try:
+        natural2mongo = compile_filter(arguments, _profile_defaults(user_data))
+    except InvalidToolArguments as e:
+        return f"Invalid search arguments: {e}"
+    logger.info(f"query: {natural2mongo}")
+    if sort_by == 'fit':
+        answer = await _prefetched_answer(conversation_id, natural2mongo)
+        if answer is not None:
+            return answer
+    try:
+        max_budget, gpa = _fit_limits(natural2mongo, user_data)
+        total, programs = await retrieve_programs(natural2mongo, sort_by=sort_by, max_budget=max_budget, gpa=gpa)
+        return render_programs(total, programs, sort_by=sort_by)
+
+    except Overloaded:
+        raise
     except Exception as e:
         return f"Error in query_mongo_db: {e}"
 
@@ -48,6 +171,11 @@ ask_db_tool = {
             "natural_language_query": {
                 "type": "string",
                 "description": "User's query"
+            },
+            "sort_by": {
+                "type": "string",
+                "enum": ["fit", "ranking", "savings", "price", "price_fit"],
+                "description": "How to rank the matches: best overall fit for the user's budget and GPA (default), best ranked, biggest discount, cheapest, or closest to the user's max budget"
             }
         },
         "required": ["natural_language_query"],
@@ -55,41 +183,103 @@ ask_db_tool = {
     }
 }
 
+search_programs_tool = {
+    "name": "search_programs",
+    "description": "Searches the database of university programs with structured filters, this should be called when data is needed to get an accurate response",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "keywords": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "Words and variants to match in the program name, type or job roles, e.g. [\"business\", \"administration\", \"mba\"]"
+            },
+            "program_type": {
+                "type": "string",
+                "description": "Type of program, e.g. MBA, MS"
+            },
+            "location": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "City or state names and abbreviations to match, e.g. [\"texas\", \"tx\"]. All programs are in the US, never pass a country"
+            },
+            "max_budget": {
+                "type": "number",
+                "description": "Maximum program price in USD; defaults to the user's budget"
+            },
+            "gpa": {
+                "type": "number",
+                "description": "The student's GPA; only programs whose minimum GPA is at most this are returned"
+            },
+            "public_private": {
+                "type": "string",
+                "enum": ["public", "private"]
+            },
+            "sort_by": {
+                "type": "string",
+                "enum": ["fit", "ranking", "savings", "price", "price_fit"],
+                "description": "How to rank the matches: best overall fit for the user's budget and GPA (default), best ranked, biggest discount, cheapest, or closest to the user's max budget"
+            }
+        },
+        "additionalProperties": False
+    }
+}
+
 say_bye_tool = {
     "name": "say_bye",
     "description": "This function should be called when the conversation ends",
 }
+
+# 'agent' translates questions to Mongo filters with ask_db_agent (an extra LLM call),
+# 'structured' lets the chat model fill search_programs filters directly
+QUERY_TOOL_MODE = os.getenv('QUERY_TOOL_MODE', 'agent')
+
+conversation_tools = [
+    {
+        "type": "function",
+        "function": search_programs_tool if QUERY_TOOL_MODE == 'structured' else ask_db_tool
+    },
+    {
+        "type": "function",
+        "function": say_bye_tool
+    }
+]
+
 class OpenAIConversation:
-    def __init__(self, model, system_prompt, user_data=None):
+    def __init__(self, model, system_prompt, user_data=None, conversation_id=None):
         self.system_prompt = system_prompt
+        self.conversation_id = conversation_id
         self.model = model
         self.system_prompt = system_prompt
         self.user_data = user_data
         self.memory = []
+        self.summary = None
         self.messages = [{"role": Role.SYSTEM.value, "content": system_prompt}] if system_prompt else []
 
-    def add_user_message(self, message):
+    async def add_user_message(self, message):
         self.messages.append({"role": Role.USER.value, "content": message})
-        return self.get_response()
+        return await self.get_response()
 
-    def get_response(self):
+    async def stream_user_message(self, message):
+        """
+        Same as add_user_message but yields the assistant reply token by token.
+        """
+        self.messages.append({"role": Role.USER.value, "content": message})
+        async for token in self.stream_response():
+            yield token
+
+    async def get_response(self):
         try:
-            response = client.chat.completions.create(
-                model=self.model,
-                tools=[
-                    {
-                        "type": "function",
-                        "function": ask_db_tool
-                    },
-                    {
-                        "type": "function",
-                        "function": say_bye_tool
-                    }
-                ],
-                messages=self.messages,
-                temperature=0,
-                max_tokens=2000,
-            )
+            async with admission.openai_chat.slot():
+                with stage("chat_completion", model=self.model) as fields:
+                    response = await services.openai_client().chat.completions.create(
+                        model=self.model,
+                        tools=conversation_tools,
+                        messages=self._context(),
+                        temperature=0,
+                        max_tokens=2000,
+                    )
+                    record_usage("chat_completion", self.model, response.usage, fields)
 
             choice = response.choices[-1]
             if choice.message.content:
@@ -99,67 +289,189 @@ class OpenAIConversation:
                 return reply
             elif choice.message.tool_calls:
                 # Handle function call
-                return self.handle_function_call(choice.message.tool_calls)
+                return await self.handle_function_call(choice.message.tool_calls)
 
+        except Overloaded:
+            raise
         except Exception as e:
             return f"Error: {str(e)}"
         
-    def get_response_no_tools(self):
+    async def get_response_no_tools(self):
         try:
-            response = client.chat.completions.create(
-                model=self.model,
-            
-                messages=self.messages,
-                temperature=0,
-                max_tokens=2000,
-            )
+            async with admission.openai_chat.slot():
+                with stage("chat_completion_no_tools", model=self.model) as fields:
+                    response = await services.openai_client().chat.completions.create(
+                        model=self.model,
+                    
+                        messages=self._context(),
+                        temperature=0,
+                        max_tokens=2000,
+                    )
+                    record_usage("chat_completion_no_tools", self.model, response.usage, fields)
 
             choice = response.choices[-1]
             reply = choice.message.content
             self.messages.append({"role": Role.ASSISTANT.value, "content": reply})
             return reply
+        except Overloaded:
+            raise
         except Exception as e:
             return f"Error: {str(e)}"
 
-    def handle_function_call(self, tool_calls):
+    async def stream_response(self, use_tools=True):
         """
-        Process function calls made by the assistant and generate an appropriate response.
+        Streaming counterpart of get_response/get_response_no_tools. Tool calls are
+        assembled from the streamed deltas, executed, and the final answer is streamed.
         """
-        print(tool_calls)
-        for tool_call in tool_calls:
-            if tool_call.function.name == "ask_database":
-                try:
-                    print(tool_call)
-                    arguments = json.loads(tool_call.function.arguments)
-                    query = eval(str(arguments))['natural_language_query']
-
-                    last_query = self.messages[-1]['content']
-                    # Call the function and retrieve the result
-                 
-                    function_response = ask_database(query, user_data=self.user_data)
+        reply = []
+        tool_calls = {}
+        stage_name = "chat_completion_stream" if use_tools else "chat_completion_stream_no_tools"
+        try:
+            async with admission.openai_chat.slot():
+                with stage(stage_name, model=self.model) as fields:
+                    started = time.perf_counter()
+                    extra = {"tools": conversation_tools} if use_tools else {}
+                    stream = await services.openai_client().chat.completions.create(
+                        model=self.model,
+                        messages=self._context(),
+                        temperature=0,
+                        max_tokens=2000,
+                        stream=True,
+                        stream_options={"include_usage": True},
+                        **extra,
+                    )
 
-                    
+                    async for chunk in stream:
+                        if chunk.usage:
+                            record_usage(stage_name, self.model, chunk.usage, fields)
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta
+                        if delta.content:
+                            if not reply:
+                                fields["ttft_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                            reply.append(delta.content)
+                            yield delta.content
+                        for call in delta.tool_calls or []:
+                            entry = tool_calls.setdefault(call.index, {"id": "", "name": "", "arguments": ""})
+                            if call.id:
+                                entry["id"] = call.id
+                            if call.function and call.function.name:
+                                entry["name"] += call.function.name
+                            if call.function and call.function.arguments:
+                                entry["arguments"] += call.function.arguments
 
-                    # Update query with function response and get new response
-                    
-                    updated_query = f"""Answer the user query {last_query} based on this data: {function_response}. 
-                    Dont bombard the user with information, just tell them like a consultant about their available options. Create your response concise and well formatted.\n
-                    Your response will be listened by users after going through a TTS model so it's important you keep it short and engaging. 
-                    You don't have to use all the program data in the conversation.
-                    Don't add the curriculum link in the response or 
-                    """
+        except Overloaded:
+            raise
+        except Exception as e:
+            yield f"Error: {str(e)}"
+            return
 
-                    self.messages.append({"role": Role.USER.value, "content": updated_query})
-                    return self.get_response_no_tools()
+        if reply:
+            self.messages.append({"role": Role.ASSISTANT.value, "content": "".join(reply)})
+            return
 
-                except Exception as e:
-                    return f"Error processing function call: {e}"
+        if tool_calls:
+            # The SDK is already loaded by now, the import only binds the names
+            from openai.types.chat import ChatCompletionMessageToolCall
+            from openai.types.chat.chat_completion_message_tool_call import Function
+            calls = [
+                ChatCompletionMessageToolCall(
+                    id=entry["id"],
+                    type="function",
+                    function=Function(name=entry["name"], arguments=entry["arguments"]),
+                )
+                for _, entry in sorted(tool_calls.items())
+            ]
+            try:
+                final_reply = await self.run_tool_calls(calls)
+            except Overloaded:
+                raise
+            except Exception as e:
+                yield f"Error processing function call: {e}"
+                return
 
-            if tool_call.function.name == 'say_bye':
+            if final_reply is not None:
+                yield final_reply
+                return
+
+            async for token in self.stream_response(use_tools=False):
+                yield token
+
+    async def handle_function_call(self, tool_calls):
+        """
+        Process function calls made by the assistant and generate an appropriate response.
+        """
+        try:
+            final_reply = await self.run_tool_calls(tool_calls)
+        except Overloaded:
+            raise
+        except Exception as e:
+            return f"Error processing function call: {e}"
+
+        if final_reply is not None:
+            return final_reply
+        return await self.get_response_no_tools()
+
+    async def run_tool_calls(self, tool_calls):
+        """
+        Executes the requested tools and appends their results to the conversation.
+        All ask_database calls of a turn run concurrently and each result goes back as a
+        tool message tied to its tool_call_id, so the model answers once with all of them.
+        Returns the final reply when a tool ends the turn, None when the model should answer.
+        """
+        logger.info(f"tool calls: {[call.function.name for call in tool_calls]}")
+        db_calls = [call for call in tool_calls if call.function.name in ("ask_database", "search_programs")]
+        if not db_calls:
+            if any(call.function.name == 'say_bye' for call in tool_calls):
                 self.messages.append({"role": Role.USER.value, "content": say_bye()})
                 return self.messages[-1]['content']
+            return None
+
+        last_query = self.messages[-1]['content']
+        semaphore = asyncio.Semaphore(TOOL_CONCURRENCY)
+        results = await asyncio.gather(*(self._run_db_call(call, semaphore) for call in db_calls))
 
+        self.messages.append({
+            "role": Role.ASSISTANT.value,
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": call.id,
+                    "type": "function",
+                    "function": {"name": call.function.name, "arguments": call.function.arguments}
+                }
+                for call in db_calls
+            ],
+        })
+        for call, function_response in zip(db_calls, results):
+            self.messages.append({"role": Role.TOOL.value, "tool_call_id": call.id, "content": function_response})
+
+        updated_query = f"""{TOOL_RESULT_PREFIX} {last_query} based on the database results above. 
+        Dont bombard the user with information, just tell them like a consultant about their available options. Create your response concise and well formatted.\n
+        Your response will be listened by users after going through a TTS model so it's important you keep it short and engaging. 
+        You don't have to use all the program data in the conversation.
+        Don't add the curriculum link in the response or 
+        """
 
+        self.messages.append({"role": Role.USER.value, "content": updated_query})
+        return None
+
+    async def _run_db_call(self, tool_call, semaphore):
+        async with semaphore:
+            try:
+                logger.info(f"tool call: {tool_call.function.name} {tool_call.function.arguments}")
+                arguments = json.loads(tool_call.function.arguments)
+                if tool_call.function.name == "search_programs":
+                    return await search_programs(arguments, user_data=self.user_data, conversation_id=self.conversation_id)
+                query = arguments['natural_language_query']
+                # Call the function and retrieve the result
+                return await ask_database(
+                    query, user_data=self.user_data, sort_by=arguments.get('sort_by'), conversation_id=self.conversation_id)
+            except Overloaded:
+                raise
+            except Exception as e:
+                return f"Error processing function call: {e}"
 
     def start_conversation(self, initial_message):
         self.messages.append({"role": Role.ASSISTANT.value, "content": initial_message})
@@ -167,13 +479,22 @@ class OpenAIConversation:
     def reset_conversation(self):
         self.messages = [{"role": Role.SYSTEM.value, "content": self.system_prompt}]
 
-    def set_conversation(self, conversation):
-        self.messages = conversation
+    def set_conversation(self, conversation, summary=None):
+        # Copy: the caller's list may be shared (e.g. the hot-session cache)
+        self.messages = list(conversation)
+        self.summary = summary
+
+    def _context(self):
+        # What actually goes to the model: system prompt, summary and the recent window
+        return build_context(self.messages, summary=self.summary)
 
     def get_conversation(self):
         return self.messages
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+
     system_prompt = (
         "You are an AI consultant to help users who want to study abroad.\n"
         "Answer all their questions regarding courses, universities, eligibility, etc.\n"
@@ -187,15 +508,18 @@ if __name__ == "__main__":
         "or any other questions you might have."
     )
 
-    conv = OpenAIConversation(model="gpt-4o", system_prompt=system_prompt)
-    print("Agent:", initial_message)
-    conv.start_conversation(initial_message=initial_message)
+    async def main():
+        conv = OpenAIConversation(model="gpt-4o", system_prompt=system_prompt)
+        print("Agent:", initial_message)
+        conv.start_conversation(initial_message=initial_message)
+
+        while True:
+            user_input = input("User: ")
+            if user_input.lower() == "exit_chat":
+                break
+            agent_response = await conv.add_user_message(user_input)
+            print("Agent:", agent_response)
 
-    while True:
-        user_input = input("User: ")
-        if user_input.lower() == "exit_chat":
-            break
-        agent_response = conv.add_user_message(user_input)
-        print("Agent:", agent_response)
+        print("Conversation Log:", conv.get_conversation())
 
-    print("Conversation Log:", conv.get_conversation())
+    asyncio.run(main())
@@ -1,28 +1,25 @@
-from groq import Groq
 import os
 import time
-from dotenv import load_dotenv
-load_dotenv()
 
-client = Groq()
+from utils import admission, services
+from utils.metrics import stage
 
 
-
-def stt(filename: str, lang: str, system):
-  # Open the audio file
+async def stt(audio: bytes, lang: str, system, filename: str = "audio.wav"):
+  # `filename` is only used by the API to infer the audio container
   try:
-    with open(filename, "rb") as file:
-        
-        # Create a transcription of the audio file
-        transcription = client.audio.transcriptions.create(
-          file=(filename, file.read()), # Required audio file
+    # Create a transcription of the audio bytes
+    async with admission.groq_stt.slot():
+      with stage("stt", bytes=len(audio)):
+        transcription = await services.groq_client().audio.transcriptions.create(
+          file=(filename, audio), # Required audio file
           model="whisper-large-v3-turbo", # Required model to use for transcription
           prompt=system,  # Optional
           response_format="json",  # Optional
           language=lang,  # Optional
           temperature=0.0  # Optional
         )
-        # Print the transcription text
-        return transcription.text
+    # Print the transcription text
+    return transcription.text
   except Exception as e:
-     raise e
\ No newline at end of file
+     raise e
@@ -1,17 +1,67 @@
-from pathlib import Path
-from openai import OpenAI
-from dotenv import load_dotenv
-
-load_dotenv()
-client = OpenAI()
-
-
-def generate_speech(text, voice="alloy", model="tts-1", output_file="response.mp3"):
-    speech_file_path = output_file
-    response = client.audio.speech.create(
-      model="tts-1",
-      voice="alloy",
-      input=text
-    )
-    response.write_to_file(speech_file_path)
-    return speech_file_path
\ No newline at end of file
+import time
+
+from llm.tts_cache import tts_cache
+from utils import admission, services
+from utils.metrics import stage
+
+
+async def generate_speech(text, voice="alloy", model="tts-1", response_format="mp3"):
+    """
+    Synthesises `text` and returns the raw audio bytes. Repeated texts are served from tts_cache.
+    """
+    with stage("generate_speech", model=model, chars=len(text)) as fields:
+        key = tts_cache.key(text, voice, model, response_format)
+        audio = await tts_cache.get(key)
+        fields["cache_hit"] = audio is not None
+        if audio is None:
+            async with admission.openai_tts.slot():
+                response = await services.openai_client().audio.speech.create(
+                  model=model,
+                  voice=voice,
+                  input=text,
+                  response_format=response_format,
+                )
+                audio = response.content
+            tts_cache.put(key, audio)
+        fields["bytes"] = len(audio)
+    return audio
+
+
+# Media types for the response formats the TTS API can produce (opus comes in an Ogg container)
+AUDIO_MEDIA_TYPES = {
+    "mp3": "audio/mpeg",
+    "opus": "audio/ogg; codecs=opus",
+    "aac": "audio/aac",
+    "flac": "audio/flac",
+    "wav": "audio/wav",
+    "pcm": "audio/L16; rate=24000; channels=1",
+}
+
+
+async def stream_speech(text, voice="alloy", model="tts-1", response_format="mp3"):
+    """
+    Yields audio chunks as the TTS API produces them so callers can start sending
+    bytes before synthesis finishes. The full clip is stored in tts_cache afterwards.
+    """
+    key = tts_cache.key(text, voice, model, response_format)
+    audio = await tts_cache.get(key)
+    if audio is not None:
+        yield audio
+        return
+
+    chunks = []
+    async with admission.openai_tts.slot():
+        with stage("stream_speech", model=model, chars=len(text)) as fields:
+            started = time.perf_counter()
+            async with services.openai_client().audio.speech.with_streaming_response.create(
+              model=model,
+              voice=voice,
+              input=text,
+              response_format=response_format,
+            ) as response:
+                async for chunk in response.iter_bytes():
+                    if not chunks:
+                        fields["first_byte_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                    chunks.append(chunk)
+                    yield chunk
+    tts_cache.put(key, b"".join(chunks))
@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+from datetime import datetime
+
+from utils.cache import TTLCache
+from utils.database import get_db
+
+logger = logging.getLogger(__name__)
+
+QUERY_CACHE_COLLECTION = 'QueryTranslationCache'
+
+
+def normalize_query(query):
+    query = str(query).lower()
+    query = re.sub(r"[^\w\s$.]", " ", query)
+    query = re.sub(r"\s+", " ", query)
+    return query.strip(" .")
+
+
+def filter_relevant_user_fields(user_data):
+    """
+    The only profile fields that change the generated filter are the budget ceiling
+    and the GPA; everything else in the profile must not fragment the cache.
+    """
+    if not user_data:
+        return {}
+    fields = {}
+    budget_range = user_data.get('budget_range')
+    if budget_range:
+        fields['max_budget'] = str(budget_range).split('-')[-1].strip()
+    for key in ('gpa', 'cgpa', 'GPA'):
+        if user_data.get(key) is not None:
+            fields['gpa'] = str(user_data[key])
+            break
+    return fields
+
+
+class QueryTranslationCache:
+    """
+    Caches natural language -> Mongo filter translations from ask_db_agent with LRU/TTL
+    eviction in memory and, optionally, a Mongo collection (with a TTL index) behind it
+    so translations survive restarts. Concurrent misses on the same key share one call.
+    """
+
+    def __init__(self, maxsize, ttl, persist=False):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.persist = persist
+        self.persistent_hits = 0
+        self.translations = 0
+        self._inflight = {}
+
+    @staticmethod
+    def key(query, user_data):
+        raw = json.dumps([normalize_query(query), filter_relevant_user_fields(user_data)], sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get_or_translate(self, query, user_data, translate):
+        key = self.key(query, user_data)
+        translation = self.memory.get(key)
+        if translation is not None:
+            return translation
+
+        while key in self._inflight:
+            pending = self._inflight[key]
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling() or not pending.cancelled():
+                    raise
+                # The request translating this was cancelled, take over from it
+                translation = self.memory.get(key)
+                if translation is not None:
+                    return translation
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            translation = await self._load(key)
+            if translation is None:
+                translation = await translate(query, user_data)
+                self.translations += 1
+                # Never cache a translation that won't parse, it would fail on every hit
+                json.loads(translation)
+                await self._store(key, query, user_data, translation)
+            self.memory.set(key, translation)
+            future.set_result(translation)
+            return translation
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        finally:
+            # Cancelled (e.g. the client disconnected): release the waiters instead of leaving them hanging
+            if not future.done():
+                future.cancel()
+            del self._inflight[key]
+
+    def _collection(self):
+        return get_db().get_collection(QUERY_CACHE_COLLECTION)
+
+    async def ensure_index(self):
+        """Creates the TTL index on startup; stores don't depend on it having worked."""
+        if not self.persist:
+            return
+        try:
+            await self._collection().create_index("createdAt", expireAfterSeconds=int(self.ttl))
+        except Exception as e:
+            # e.g. IndexOptionsConflict after QUERY_CACHE_TTL_SECONDS changed between deploys
+            logger.error(f"Query cache TTL index not created: {e}")
+
+    async def _load(self, key):
+        if not self.persist:
+            return None
+        try:
+            doc = await self._collection().find_one({"_id": key}, {"translation": 1})
+        except Exception as e:
+            logger.error(f"Query cache lookup failed: {e}")
+            return None
+        if doc:
+            self.persistent_hits += 1
+            return doc["translation"]
+        return None
+
+    async def _store(self, key, query, user_data, translation):
+        if not self.persist:
+            return
+        try:
+            await self._collection().replace_one(
+                {"_id": key},
+                {
+                    "query": normalize_query(query),
+                    "user_fields": filter_relevant_user_fields(user_data),
+                    # Stored as the raw JSON text: Mongo filters have $-prefixed keys
+                    "translation": translation,
+                    "createdAt": datetime.utcnow(),
+                },
+                upsert=True,
+            )
+        except Exception as e:
+            logger.error(f"Query cache store failed: {e}")
+
+    def stats(self):
+        stats = self.memory.stats()
+        stats.update({
+            "persistent_hits": self.persistent_hits,
+            "translations": self.translations,
+            "inflight": len(self._inflight),
+        })
+        return stats
+
+
+query_cache = QueryTranslationCache(
+    maxsize=int(os.getenv('QUERY_CACHE_SIZE', 1024)),
+    ttl=float(os.getenv('QUERY_CACHE_TTL_SECONDS', 24 * 3600)),
+    persist=os.getenv('QUERY_CACHE_PERSIST', '0') == '1',
+)
@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): concurrent evictions just tolerate each other's deletes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Disk eviction goes down to this fraction of max_disk_bytes, so the next rescan is a while off
+TTS_CACHE_DISK_LOW_WATER = float(os.getenv('TTS_CACHE_DISK_LOW_WATER', 0.9))
+
+
+class TTSCache:
+    """
+    Content-addressed audio cache with two tiers: an in-memory LRU bounded by
+    `max_memory_bytes` and an on-disk directory bounded by `max_disk_bytes`
+    (least recently used files are evicted first). Disk writes happen in the background,
+    off the caller's path. The directory may be shared by several workers: it is the
+    source of truth, rescanned under a file lock on the first write and then only once
+    this worker's running estimate of its size goes over `max_disk_bytes` (so it can run
+    over by what other workers wrote since); files another worker removed are simply misses.
+    """
+
+    def __init__(self, max_memory_bytes, cache_dir=None, max_disk_bytes=0):
+        self.max_memory_bytes = max_memory_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        # Last scan of cache_dir plus this worker's writes since, other workers may have added more
+        self._disk_entries = 0
+        self._disk_bytes = 0
+        self._disk_scanned = False
+        self._disk_lock = threading.Lock()
+        self._writes = set()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(text, voice, model, response_format):
+        raw = "\x1f".join([model, voice, response_format, text])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key):
+        audio = self._memory.get(key)
+        if audio is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return audio
+
+        if self.cache_dir and self.max_disk_bytes:
+            audio = await asyncio.to_thread(self._read_disk, key)
+            if audio is not None:
+                self.disk_hits += 1
+                self._put_memory(key, audio)
+                return audio
+
+        self.misses += 1
+        return None
+
+    def put(self, key, audio):
+        """Stores `audio` in memory now and schedules the disk write, which the caller doesn't wait for."""
+        self._put_memory(key, audio)
+        if self.cache_dir and self.max_disk_bytes and len(audio) <= self.max_disk_bytes:
+            task = asyncio.create_task(asyncio.to_thread(self._write_disk, key, audio))
+            self._writes.add(task)
+            task.add_done_callback(self._write_done)
+
+    def _write_done(self, task):
+        self._writes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"TTS cache disk write failed: {task.exception()}")
+
+    def _put_memory(self, key, audio):
+        if len(audio) > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+            # Bump mtime so eviction follows recency of use
+            os.utime(path)
+            return audio
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key, audio):
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Per-process temp name: two workers may synthesise the same sentence at once
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+        with self._disk_lock:
+            self._disk_entries += 1
+            self._disk_bytes += len(audio)
+            if self._disk_scanned and self._disk_bytes <= self.max_disk_bytes:
+                return
+            with open(os.path.join(self.cache_dir, ".lock"), "a") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                self._evict_disk()
+
+    def _scan_disk(self):
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.startswith(".") or entry.name.endswith(".tmp"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _evict_disk(self):
+        files = self._scan_disk()
+        total = sum(size for _, size, _ in files)
+        entries = len(files)
+        if total > self.max_disk_bytes:
+            target = self.max_disk_bytes * TTS_CACHE_DISK_LOW_WATER
+            for _, size, path in sorted(files):
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                    self.evictions += 1
+                except FileNotFoundError:
+                    pass
+                total -= size
+                entries -= 1
+        self._disk_entries = entries
+        self._disk_bytes = total
+        self._disk_scanned = True
+
+    def stats(self):
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_entries": self._disk_entries,
+            "disk_bytes": self._disk_bytes,
+            "disk_writes_pending": len(self._writes),
+        }
+
+
+tts_cache = TTSCache(
+    max_memory_bytes=int(os.getenv('TTS_CACHE_MEMORY_BYTES', 32 * 1024 * 1024)),
+    cache_dir=os.getenv('TTS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'glovera_tts_cache')),
+    max_disk_bytes=int(os.getenv('TTS_CACHE_DISK_BYTES', 512 * 1024 * 1024)),
+)
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import os
+import re
+from collections import deque
+
+from llm.openai_tts import generate_speech
+
+logger = logging.getLogger(__name__)
+
+# Shorter fragments are merged into the next sentence so we don't pay a TTS round trip per "Sure."
+MIN_SENTENCE_CHARS = int(os.getenv('TTS_MIN_SENTENCE_CHARS', 40))
+
+_boundary = re.compile(r'(?<=[.!?:])\s+|\n+')
+
+
+class SentenceSplitter:
+    """Accumulates streamed text and hands back complete sentences as soon as they end."""
+
+    def __init__(self, min_chars=MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, text):
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in _boundary.finditer(self.buffer):
+            candidate = self.buffer[start:match.start()].strip()
+            if len(candidate) >= self.min_chars:
+                sentences.append(candidate)
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return [rest] if rest else []
+
+
+async def speak_stream(token_stream, voice="alloy", model="tts-1", response_format="mp3"):
+    """
+    Consumes an async iterator of text tokens and yields ("text", token) events as they
+    arrive, ("text_done",) once the token stream ends, and ("audio", index, sentence,
+    audio_bytes) events in sentence order. TTS for a sentence starts as soon as it is
+    complete, while the LLM keeps generating. A sentence whose TTS fails (Overloaded
+    included) yields ("audio_error", index, sentence, exception) instead; text keeps flowing.
+    """
+    pending = deque()
+    splitter = SentenceSplitter()
+    index = 0
+
+    def schedule(sentence):
+        nonlocal index
+        task = asyncio.create_task(generate_speech(sentence, voice=voice, model=model, response_format=response_format))
+        pending.append((index, sentence, task))
+        index += 1
+
+    try:
+        async for token in token_stream:
+            yield ("text", token)
+            for sentence in splitter.feed(token):
+                schedule(sentence)
+            # Emit whatever audio is already done without waiting on the rest
+            while pending and pending[0][2].done():
+                yield _audio_event(*pending.popleft())
+
+        yield ("text_done",)
+        for sentence in splitter.flush():
+            schedule(sentence)
+        while pending:
+            i, sentence, task = pending[0]
+            await asyncio.wait([task])
+            yield _audio_event(*pending.popleft())
+    finally:
+        for _, _, task in pending:
+            if task.done():
+                # Retrieve it so a failed sentence isn't logged as "exception was never retrieved"
+                if not task.cancelled():
+                    task.exception()
+            else:
+                task.cancel()
+
+
+def _audio_event(index, sentence, task):
+    if task.cancelled():
+        return ("audio_error", index, sentence, asyncio.CancelledError())
+    error = task.exception()
+    if error is not None:
+        logger.warning(f"TTS failed for sentence {index}: {error}")
+        return ("audio_error", index, sentence, error)
+    return ("audio", index, sentence, task.result())
@@ -1,3 +1,10 @@
+import asyncio
+
+from dotenv import load_dotenv
+
+# Before the app modules, they read their settings at import
+load_dotenv()
+
 from llm.glovera_chat import OpenAIConversation
 
 
@@ -17,13 +24,17 @@ initial_message = (
     "or any other questions you might have."
 )
 
-conv = OpenAIConversation(model="gpt-4o", system_prompt=system_prompt)
-print("Agent:", initial_message)
-conv.start_conversation(initial_message=initial_message)
 
-while True:
-    user_input = input("User: ")
-    if user_input.lower() == "exit_chat":
-        break
-    agent_response = conv.add_user_message(user_input)
-    print("Agent:", agent_response)
\ No newline at end of file
+async def main():
+    conv = OpenAIConversation(model="gpt-4o", system_prompt=system_prompt)
+    print("Agent:", initial_message)
+    conv.start_conversation(initial_message=initial_message)
+
+    while True:
+        user_input = input("User: ")
+        if user_input.lower() == "exit_chat":
+            break
+        agent_response = await conv.add_user_message(user_input)
+        print("Agent:", agent_response)
+
+asyncio.run(main())
\ No newline at end of file
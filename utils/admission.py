@@ -0,0 +1,112 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+from utils.metrics import UPSTREAM_IN_FLIGHT, UPSTREAM_QUEUE_DEPTH, UPSTREAM_QUEUE_WAIT, UPSTREAM_REJECTED
+
+# How long a call may wait for a slot before it is turned away
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv('ADMISSION_QUEUE_TIMEOUT_SECONDS', 5))
+# Sent back as Retry-After when a request is turned away
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv('ADMISSION_RETRY_AFTER_SECONDS', 2))
+# 503 (we are overloaded) or 429 (slow down)
+ADMISSION_REJECT_STATUS = int(os.getenv('ADMISSION_REJECT_STATUS', 503))
+
+
+class Overloaded(Exception):
+    def __init__(self, upstream, reason):
+        super().__init__(f"{upstream} is overloaded ({reason})")
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = ADMISSION_RETRY_AFTER_SECONDS
+
+
+class UpstreamLimiter:
+    """
+    Lets at most `concurrency` calls to one upstream run at once. Up to `max_queue` more
+    wait for a slot, for at most `queue_timeout` seconds; past either bound the call
+    fails right away with Overloaded instead of piling up behind the others.
+    """
+
+    def __init__(self, name, concurrency, max_queue, queue_timeout=ADMISSION_QUEUE_TIMEOUT_SECONDS):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _reject(self, reason):
+        if reason == 'timeout':
+            self.timed_out += 1
+        else:
+            self.rejected += 1
+        UPSTREAM_REJECTED.labels(self.name, reason).inc()
+        raise Overloaded(self.name, reason)
+
+    def check(self):
+        """Fails fast when a new call would be turned away, for callers that can't report errors later."""
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self._reject('queue_full')
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self._reject('queue_full')
+            self.waiting += 1
+            UPSTREAM_QUEUE_DEPTH.labels(self.name).set(self.waiting)
+            started = time.perf_counter()
+            try:
+                async with asyncio.timeout(self.queue_timeout):
+                    await self._semaphore.acquire()
+            except TimeoutError:
+                self._reject('timeout')
+            finally:
+                self.waiting -= 1
+                UPSTREAM_QUEUE_DEPTH.labels(self.name).set(self.waiting)
+                UPSTREAM_QUEUE_WAIT.labels(self.name).observe(time.perf_counter() - started)
+        else:
+            await self._semaphore.acquire()
+
+        self.in_flight += 1
+        UPSTREAM_IN_FLIGHT.labels(self.name).set(self.in_flight)
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            UPSTREAM_IN_FLIGHT.labels(self.name).set(self.in_flight)
+            self._semaphore.release()
+
+    def stats(self):
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+def _limiter(name, env_prefix, concurrency, max_queue):
+    return UpstreamLimiter(
+        name,
+        concurrency=int(os.getenv(f'{env_prefix}_CONCURRENCY', concurrency)),
+        max_queue=int(os.getenv(f'{env_prefix}_QUEUE_SIZE', max_queue)),
+    )
+
+
+openai_chat = _limiter('openai_chat', 'OPENAI_CHAT', 32, 64)
+openai_tts = _limiter('openai_tts', 'OPENAI_TTS', 16, 32)
+groq_stt = _limiter('groq_stt', 'GROQ_STT', 16, 32)
+mongo = _limiter('mongo', 'MONGO', int(os.getenv('MONGO_MAX_POOL_SIZE', 50)), 200)
+
+limiters = (openai_chat, openai_tts, groq_stt, mongo)
+
+
+def stats():
+    return {limiter.name: limiter.stats() for limiter in limiters}
@@ -0,0 +1,255 @@
+"""
+Columnar on-disk format for the program catalog, meant to be memory-mapped read-only
+by every worker on a node so they share one copy through the page cache.
+
+Layout: MAGIC, the header length (uint64), a JSON header, then 8-byte aligned sections
+the header points at as [offset, length] from the end of the header:
+
+- numeric columns: float64 per program, NaN when missing ("int" marks integer columns)
+- string/json columns: uint32 per program into the column's string table (MISSING when
+  absent); json columns hold bson extended JSON for values that aren't plain strings
+- string tables: a UTF-8 blob plus uint32 offsets (n + 1)
+- token indexes: a sorted term table, uint32 postings with the term's count in each
+  program, offsets per term, and the token count of the field per program
+- numeric indexes: values sorted ascending (float64) and the matching program ids (uint32)
+"""
+import array
+import bisect
+import json
+import math
+import mmap
+import os
+import struct
+import time
+from collections import Counter
+
+from bson import json_util
+
+MAGIC = b'GLVCAT02'
+MISSING = 0xFFFFFFFF
+
+_header_struct = struct.Struct('<Q')
+# array/memoryview typecode of a 4-byte unsigned int on this platform
+_UINT32 = 'I' if array.array('I').itemsize == 4 else 'L'
+
+
+def _uint32(values=()):
+    return array.array(_UINT32, values)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class _SectionWriter:
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def add(self, data):
+        padding = -self.size % 8
+        if padding:
+            self.chunks.append(b'\0' * padding)
+            self.size += padding
+        start = self.size
+        data = bytes(data)
+        self.chunks.append(data)
+        self.size += len(data)
+        return [start, len(data)]
+
+    def add_strings(self, strings):
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = _uint32([0])
+        for item in encoded:
+            offsets.append(offsets[-1] + len(item))
+        return {'blob': self.add(b''.join(encoded)), 'offsets': self.add(offsets)}
+
+
+def _column_type(values):
+    present = [v for v in values if v is not None]
+    if all(_is_number(v) for v in present):
+        return 'number'
+    if all(isinstance(v, str) for v in present):
+        return 'string'
+    return 'json'
+
+
+def _tokens_by_id(values, tokenize):
+    postings = {}
+    lengths = _uint32(0 for _ in values)
+    for i, value in enumerate(values):
+        if value is None:
+            continue
+        tokens = tokenize(value)
+        lengths[i] = len(tokens)
+        for token, count in Counter(tokens).items():
+            postings.setdefault(token, []).append((i, count))
+    return postings, lengths
+
+
+def write_catalog_file(path, docs, text_fields, numeric_fields, tokenize):
+    """
+    Writes `docs` to `path` atomically: the file is built next to it and renamed over it,
+    so readers that already mapped the old file keep a consistent view.
+    """
+    docs = list(docs)
+    fields = sorted({field for doc in docs for field in doc if field != '_id'})
+    writer = _SectionWriter()
+    header = {'count': len(docs), 'built_at': time.time(), 'columns': {}, 'tokens': {}, 'numeric': {}}
+
+    for field in fields:
+        values = [doc.get(field) for doc in docs]
+        kind = _column_type(values)
+        column = {'type': kind}
+        if kind == 'number':
+            column['int'] = all(isinstance(v, int) for v in values if v is not None)
+            column['values'] = writer.add(array.array('d', (math.nan if v is None else float(v) for v in values)))
+        else:
+            encode = (lambda v: v) if kind == 'string' else json_util.dumps
+            table = {}
+            ids = _uint32(MISSING if v is None else table.setdefault(encode(v), len(table)) for v in values)
+            column['ids'] = writer.add(ids)
+            column['strings'] = writer.add_strings(table)
+        header['columns'][field] = column
+
+    for field in text_fields:
+        postings, lengths = _tokens_by_id([doc.get(field) for doc in docs], tokenize)
+        terms = sorted(postings)
+        offsets = _uint32([0])
+        flat = _uint32()
+        counts = _uint32()
+        for term in terms:
+            flat.extend(i for i, _ in postings[term])
+            counts.extend(count for _, count in postings[term])
+            offsets.append(len(flat))
+        header['tokens'][field] = {
+            'terms': writer.add_strings(terms), 'offsets': writer.add(offsets), 'postings': writer.add(flat),
+            'counts': writer.add(counts), 'lengths': writer.add(lengths),
+        }
+
+    for field in numeric_fields:
+        pairs = sorted((doc[field], i) for i, doc in enumerate(docs) if _is_number(doc.get(field)))
+        header['numeric'][field] = {
+            'values': writer.add(array.array('d', (v for v, _ in pairs))),
+            'ids': writer.add(_uint32(i for _, i in pairs)),
+        }
+
+    encoded_header = json.dumps(header).encode('utf-8')
+    encoded_header += b' ' * (-(len(MAGIC) + _header_struct.size + len(encoded_header)) % 8)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(_header_struct.pack(len(encoded_header)))
+        f.write(encoded_header)
+        for chunk in writer.chunks:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class _StringTable:
+    def __init__(self, catalog_file, spec):
+        self.blob = catalog_file.section(spec['blob'])
+        self.offsets = catalog_file.section(spec['offsets'], _UINT32)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, k):
+        return str(self.blob[self.offsets[k]:self.offsets[k + 1]], 'utf-8')
+
+
+class TokenIndex:
+    """Read-only token -> program ids mapping over a mapped term table."""
+
+    def __init__(self, catalog_file, spec):
+        self.terms = _StringTable(catalog_file, spec['terms'])
+        self.offsets = catalog_file.section(spec['offsets'], _UINT32)
+        self.postings = catalog_file.section(spec['postings'], _UINT32)
+        self.counts = catalog_file.section(spec['counts'], _UINT32)
+        # Tokens in the field per program, for length normalisation
+        self.lengths = catalog_file.section(spec['lengths'], _UINT32)
+
+    def _postings(self, k):
+        return self.postings[self.offsets[k]:self.offsets[k + 1]]
+
+    def _find(self, term):
+        k = bisect.bisect_left(self.terms, term)
+        if k < len(self.terms) and self.terms[k] == term:
+            return k
+        return None
+
+    def items(self):
+        for k in range(len(self.terms)):
+            yield self.terms[k], self._postings(k)
+
+    def get(self, term, default=None):
+        k = self._find(term)
+        return default if k is None else self._postings(k)
+
+    def counts_of(self, term):
+        """(program id, occurrences) pairs of `term`."""
+        k = self._find(term)
+        if k is None:
+            return ()
+        start, end = self.offsets[k], self.offsets[k + 1]
+        return zip(self.postings[start:end], self.counts[start:end])
+
+
+class CatalogFile:
+    """A catalog file mapped read-only; values are decoded on access."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a catalog file")
+        header_start = len(MAGIC) + _header_struct.size
+        (header_length,) = _header_struct.unpack(view[len(MAGIC):header_start])
+        self.header = json.loads(bytes(view[header_start:header_start + header_length]))
+        self._data = view[header_start + header_length:]
+
+        self.count = self.header['count']
+        self.built_at = self.header['built_at']
+        self.columns = {}
+        for field, spec in self.header['columns'].items():
+            if spec['type'] == 'number':
+                self.columns[field] = (spec['type'], spec['int'], self.section(spec['values'], 'd'))
+            else:
+                self.columns[field] = (
+                    spec['type'], self.section(spec['ids'], _UINT32), _StringTable(self, spec['strings']))
+
+    def section(self, spec, typecode=None):
+        offset, length = spec
+        view = self._data[offset:offset + length]
+        return view if typecode is None else view.cast(typecode)
+
+    def value(self, i, field, default=None):
+        column = self.columns.get(field)
+        if column is None:
+            return default
+        if column[0] == 'number':
+            value = column[2][i]
+            if math.isnan(value):
+                return default
+            return int(value) if column[1] else value
+        k = column[1][i]
+        if k == MISSING:
+            return default
+        value = column[2][k]
+        return value if column[0] == 'string' else json_util.loads(value)
+
+    def token_index(self, field):
+        spec = self.header['tokens'].get(field)
+        return TokenIndex(self, spec) if spec else None
+
+    def numeric_index(self, field):
+        spec = self.header['numeric'].get(field)
+        if spec is None:
+            return None
+        return self.section(spec['values'], 'd'), self.section(spec['ids'], _UINT32)
@@ -1,28 +1,145 @@
-from pymongo.mongo_client import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
 from pymongo.server_api import ServerApi
+import asyncio
 import os
 import logging
+import threading
 
-def get_db_connection():
-    client = MongoClient(os.getenv('MONGO_URI'), server_api=ServerApi('1'))
+DB_NAME = 'glovera_db'
+
+# Process-wide client, created once by get_db_connection() at app startup
+_client = None
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Keeps running counters on the Mongo connection pool so it can be sized."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open_connections = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections -= 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        wait_ms = event.duration * 1000
+        with self._lock:
+            self.checked_out += 1
+            self.checkouts += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "max_pool_size": int(os.getenv('MONGO_MAX_POOL_SIZE', 50)),
+                "open_connections": self.open_connections,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "avg_wait_ms": self.total_wait_ms / self.checkouts if self.checkouts else 0.0,
+                "max_wait_ms": self.max_wait_ms,
+            }
+
+
+pool_stats = PoolStatsListener()
+
+
+def _client_options():
+    return {
+        "maxPoolSize": int(os.getenv('MONGO_MAX_POOL_SIZE', 50)),
+        "minPoolSize": int(os.getenv('MONGO_MIN_POOL_SIZE', 0)),
+        "maxIdleTimeMS": int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 300000)),
+        "waitQueueTimeoutMS": int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000)),
+        "serverSelectionTimeoutMS": int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+        "connectTimeoutMS": int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+        "socketTimeoutMS": int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 20000)),
+        "readPreference": os.getenv('MONGO_READ_PREFERENCE', 'primary'),
+    }
+
+
+async def get_db_connection():
+    """
+    Creates the shared client. The driver connects in the background, so this doesn't
+    wait on (or fail with) the server; use ping_db() to find out whether it answers.
+    """
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(
+            os.getenv('MONGO_URI'),
+            server_api=ServerApi('1'),
+            event_listeners=[pool_stats],
+            **_client_options(),
+        )
+    return _client.get_database(DB_NAME)
+
+async def ping_db(timeout=2.0):
+    if _client is None:
+        return False
     try:
-        client.admin.command('ping')
-        quire_db = client.get_database('glovera_db')
-        print("connected to db!")
-        logging.info("Successfully connected to MongoDB!")
-        return quire_db
+        await asyncio.wait_for(_client.admin.command('ping'), timeout)
+        return True
     except Exception as e:
-        logging.error(f"Database connection error: {e}")
-        raise
+        logging.error(f"Database ping failed: {e}")
+        return False
+
+def get_db():
+    if _client is None:
+        raise RuntimeError("MongoDB client is not initialised, call get_db_connection() first")
+    return _client.get_database(DB_NAME)
+
+def close_db_connection():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
 
 def get_conversations_collection():
-    db = get_db_connection()
-    return db.get_collection('Conversation') 
+    return get_db().get_collection('Conversation') 
 
 
 def get_programs_collection():
-    db = get_db_connection()
-    return db.get_collection('ProgramsGloveraFinal')
+    return get_db().get_collection('ProgramsGloveraFinal')
 
 def get_collection_by_name(db, collection_name):
-    return db.get_collection(collection_name)
\ No newline at end of file
+    return db.get_collection(collection_name)
@@ -0,0 +1,109 @@
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+trace_logger = logging.getLogger('glovera.trace')
+
+# Set per request by the tracing middleware in api.py
+trace_id_var = contextvars.ContextVar('trace_id', default=None)
+
+_latency_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_LATENCY = Histogram(
+    'glovera_stage_latency_seconds', 'Latency of one pipeline stage', ['stage'], buckets=_latency_buckets)
+STAGE_ERRORS = Counter('glovera_stage_errors_total', 'Pipeline stages that raised', ['stage'])
+LLM_TOKENS = Counter('glovera_llm_tokens_total', 'LLM tokens by stage and kind', ['stage', 'model', 'kind'])
+HTTP_LATENCY = Histogram(
+    'glovera_http_request_latency_seconds', 'Time to response headers per route',
+    ['method', 'route', 'status'], buckets=_latency_buckets)
+UPSTREAM_IN_FLIGHT = Gauge('glovera_upstream_in_flight', 'Upstream calls holding a slot', ['upstream'])
+UPSTREAM_QUEUE_DEPTH = Gauge('glovera_upstream_queue_depth', 'Calls waiting for an upstream slot', ['upstream'])
+UPSTREAM_QUEUE_WAIT = Histogram(
+    'glovera_upstream_queue_wait_seconds', 'Time spent waiting for an upstream slot', ['upstream'],
+    buckets=_latency_buckets)
+UPSTREAM_REJECTED = Counter(
+    'glovera_upstream_rejected_total', 'Calls turned away by admission control', ['upstream', 'reason'])
+
+
+def log_event(event, **fields):
+    fields.update({"event": event, "trace_id": trace_id_var.get(), "ts": round(time.time(), 3)})
+    trace_logger.info(json.dumps(fields, default=str))
+
+
+@contextmanager
+def stage(name, **fields):
+    """
+    Times a pipeline stage into the glovera_stage_latency_seconds histogram and logs a
+    structured JSON line tagged with the current trace id. Extra `fields` can also be
+    added by the body through the yielded dict.
+    """
+    started = time.perf_counter()
+    ok = True
+    try:
+        yield fields
+    except (GeneratorExit, asyncio.CancelledError):
+        # Client went away or the task was cancelled, not a failure of the stage
+        fields["cancelled"] = True
+        raise
+    except BaseException:
+        ok = False
+        STAGE_ERRORS.labels(name).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_LATENCY.labels(name).observe(elapsed)
+        log_event("stage", stage=name, ms=round(elapsed * 1000, 2), ok=ok, **fields)
+
+
+def record_usage(stage_name, model, usage, fields=None):
+    """Counts prompt/completion/cached tokens from an OpenAI usage object."""
+    if usage is None:
+        return
+    details = getattr(usage, 'prompt_tokens_details', None)
+    counts = {
+        'prompt': usage.prompt_tokens or 0,
+        'completion': usage.completion_tokens or 0,
+        'cached': (getattr(details, 'cached_tokens', None) or 0) if details else 0,
+    }
+    for kind, count in counts.items():
+        LLM_TOKENS.labels(stage_name, model or 'unknown', kind).inc(count)
+        if fields is not None:
+            fields[f'{kind}_tokens'] = count
+
+
+class _StatsCollector:
+    """Exposes a stats() style dict of numbers as gauges named <prefix>_<key>."""
+
+    def __init__(self, prefix, documentation, stats):
+        self.prefix = prefix
+        self.documentation = documentation
+        self.stats = stats
+
+    def collect(self):
+        for key, value in _flatten(self.stats()).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield GaugeMetricFamily(f'{self.prefix}_{key}', self.documentation, value=value)
+
+
+def _flatten(stats, prefix=''):
+    flat = {}
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f'{prefix}{key}_'))
+        else:
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def register_stats(prefix, documentation, stats):
+    REGISTRY.register(_StatsCollector(prefix, documentation, stats))
+
+
+def render_metrics():
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import os
+
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', '1') == '1'
+PREFETCH_SIZE = int(os.getenv('PREFETCH_SIZE', 2048))
+# A prefetch still running after this long is cancelled, and results expire after it too
+PREFETCH_TTL_SECONDS = float(os.getenv('PREFETCH_TTL_SECONDS', 600))
+# How long a request waits for a prefetch that is still running before doing the work itself
+PREFETCH_WAIT_SECONDS = float(os.getenv('PREFETCH_WAIT_SECONDS', 0.5))
+
+# key (conversation id) -> prefetched value
+results = TTLCache(maxsize=PREFETCH_SIZE, ttl=PREFETCH_TTL_SECONDS)
+_tasks = {}
+_counters = {"started": 0, "completed": 0, "failed": 0, "expired": 0, "cancelled": 0, "served": 0, "missed": 0}
+
+
+def start(key, coroutine):
+    """Runs `coroutine` in the background and keeps its result under `key`."""
+    if not PREFETCH_ENABLED:
+        coroutine.close()
+        return
+    cancel(key)
+    task = asyncio.create_task(_run(key, coroutine))
+    _tasks[key] = task
+    task.add_done_callback(lambda done: _finished(key, done, coroutine))
+    _counters["started"] += 1
+
+
+def _finished(key, task, coroutine):
+    if _tasks.get(key) is task:
+        del _tasks[key]
+    if task.cancelled():
+        _counters["cancelled"] += 1
+        # A task cancelled before its first step never ran the coroutine
+        coroutine.close()
+
+
+async def _run(key, coroutine):
+    try:
+        async with asyncio.timeout(PREFETCH_TTL_SECONDS):
+            value = await coroutine
+    except TimeoutError:
+        _counters["expired"] += 1
+        return
+    except Exception as e:
+        _counters["failed"] += 1
+        logger.error(f"Prefetch for {key} failed: {e}")
+        return
+    _counters["completed"] += 1
+    if value is not None:
+        results.set(key, value)
+
+
+async def get(key):
+    """
+    The prefetched value for `key`, waiting up to PREFETCH_WAIT_SECONDS if it is still
+    being computed, or None.
+    """
+    task = _tasks.get(key)
+    if task is not None:
+        try:
+            # shield: a request giving up must not cancel the prefetch for the next one
+            await asyncio.wait_for(asyncio.shield(task), PREFETCH_WAIT_SECONDS)
+        except TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # The prefetch was cancelled (invalidated or restarted), not this request
+            if asyncio.current_task().cancelling():
+                raise
+            return None
+    return results.get(key)
+
+
+def record(served):
+    _counters["served" if served else "missed"] += 1
+
+
+def cancel(key):
+    task = _tasks.pop(key, None)
+    if task is not None:
+        task.cancel()
+    results.pop(key)
+
+
+def cancel_all():
+    for task in list(_tasks.values()):
+        task.cancel()
+    _tasks.clear()
+
+
+def stats():
+    return dict(_counters, running=len(_tasks), results=results.stats())
@@ -0,0 +1,403 @@
+import array
+import asyncio
+import bisect
+import logging
+import math
+import os
+import re
+import tempfile
+import time
+from collections.abc import Mapping, Sequence
+
+from pymongo.errors import OperationFailure
+
+from utils.catalog_file import CatalogFile, write_catalog_file
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): every worker keeps its own in-process catalog
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+TEXT_FIELDS = ('program_name', 'type_of_program', 'location', 'key_job_roles')
+NUMERIC_FIELDS = ('glovera_pricing', 'min_gpa', 'ranking')
+
+CATALOG_REFRESH_SECONDS = float(os.getenv('CATALOG_REFRESH_SECONDS', 300))
+CATALOG_USE_CHANGE_STREAM = os.getenv('CATALOG_USE_CHANGE_STREAM', '1') == '1'
+# Memory-mapped catalog shared by the workers on a node, empty to keep a copy per worker
+CATALOG_FILE = os.getenv('CATALOG_FILE', os.path.join(tempfile.gettempdir(), 'glovera_catalog.bin'))
+CATALOG_FILE_POLL_SECONDS = float(os.getenv('CATALOG_FILE_POLL_SECONDS', 2))
+
+_token_re = re.compile(r"[a-z0-9]+")
+_plain_word_re = re.compile(r"^[a-z0-9]+$")
+_regex_flags = {'i': re.IGNORECASE, 'm': re.MULTILINE, 's': re.DOTALL, 'x': re.VERBOSE}
+
+
+class UnsupportedQuery(Exception):
+    """Raised for filters the local executor can't evaluate; callers fall back to Mongo."""
+
+
+def tokenize(text):
+    return _token_re.findall(str(text).lower())
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _average_lengths(field_lengths):
+    return {field: sum(lengths) / len(lengths) if len(lengths) else 0.0 for field, lengths in field_lengths.items()}
+
+
+class ProgramCatalog:
+    """
+    Read-only snapshot of ProgramsGloveraFinal with token indexes on the text fields
+    and sorted indexes on the numeric fields. Evaluates the subset of Mongo filters
+    that ask_db_agent generates ($and, $or, $regex/$options, $lt(e)/$gt(e), $in, $eq, $ne)
+    against the snapshot.
+    """
+
+    def __init__(self, docs):
+        self.docs = list(docs)
+        self.loaded_at = time.time()
+        self.all_ids = frozenset(range(len(self.docs)))
+
+        # field -> token -> {program id: occurrences}, and the token count of each program's field
+        self.token_index = {field: {} for field in TEXT_FIELDS}
+        self.field_lengths = {field: [0] * len(self.docs) for field in TEXT_FIELDS}
+        for i, doc in enumerate(self.docs):
+            for field in TEXT_FIELDS:
+                value = doc.get(field)
+                if value is None:
+                    continue
+                tokens = tokenize(value)
+                self.field_lengths[field][i] = len(tokens)
+                for token in tokens:
+                    postings = self.token_index[field].setdefault(token, {})
+                    postings[i] = postings.get(i, 0) + 1
+        self.terms = {field: sorted(index) for field, index in self.token_index.items()}
+        self.average_lengths = _average_lengths(self.field_lengths)
+        self._number_columns = {}
+
+        # field -> (sorted values, ids in the same order)
+        self.numeric_index = {}
+        for field in NUMERIC_FIELDS:
+            pairs = sorted(
+                (doc[field], i) for i, doc in enumerate(self.docs) if _is_number(doc.get(field))
+            )
+            self.numeric_index[field] = ([v for v, _ in pairs], [i for _, i in pairs])
+
+    def __len__(self):
+        return len(self.docs)
+
+    def postings(self, field, term):
+        """(program id, occurrences) pairs of `term` in `field`."""
+        found = self.token_index[field].get(term)
+        return found.items() if found else ()
+
+    def number_column(self, field):
+        """float64 value of `field` per program (NaN where missing or not a number)."""
+        column = self._number_columns.get(field)
+        if column is None:
+            column = array.array('d', (
+                value if _is_number(value) else math.nan for value in (doc.get(field) for doc in self.docs)))
+            self._number_columns[field] = column
+        return column
+
+    def terms_with_prefix(self, field, prefix):
+        terms = self.terms[field]
+        k = bisect.bisect_left(terms, prefix)
+        while k < len(terms) and terms[k].startswith(prefix):
+            yield terms[k]
+            k += 1
+
+    def find(self, query):
+        return [self.docs[i] for i in sorted(self.match_ids(query))]
+
+    def match_ids(self, query, candidates=None):
+        if not isinstance(query, dict):
+            raise UnsupportedQuery(f"Filter must be a document, got {type(query).__name__}")
+        ids = self.all_ids if candidates is None else candidates
+        for key, condition in query.items():
+            if not ids:
+                break
+            if key == '$and':
+                for clause in condition:
+                    ids = self.match_ids(clause, ids)
+            elif key == '$or':
+                matched = set()
+                for clause in condition:
+                    matched |= self.match_ids(clause, ids)
+                ids = matched
+            elif key.startswith('$'):
+                raise UnsupportedQuery(f"Unsupported operator {key}")
+            else:
+                ids = self._match_field(key, condition, ids)
+        return set(ids)
+
+    def _match_field(self, field, condition, ids):
+        if not isinstance(condition, dict) or not any(k.startswith('$') for k in condition):
+            return {i for i in ids if self.docs[i].get(field) == condition}
+
+        for op, operand in condition.items():
+            if op == '$options':
+                continue
+            if op == '$regex':
+                ids = self._match_regex(field, operand, condition.get('$options', ''), ids)
+            elif op in ('$lt', '$lte', '$gt', '$gte'):
+                ids = self._match_range(field, op, operand, ids)
+            elif op == '$in':
+                values = list(operand)
+                ids = {i for i in ids if self.docs[i].get(field) in values}
+            elif op == '$eq':
+                ids = {i for i in ids if self.docs[i].get(field) == operand}
+            elif op == '$ne':
+                ids = {i for i in ids if self.docs[i].get(field) != operand}
+            else:
+                raise UnsupportedQuery(f"Unsupported operator {op} on {field}")
+        return ids
+
+    def _match_regex(self, field, pattern, options, ids):
+        flags = 0
+        for option in options:
+            if option not in _regex_flags:
+                raise UnsupportedQuery(f"Unsupported $regex option {option}")
+            flags |= _regex_flags[option]
+        try:
+            compiled = re.compile(pattern, flags)
+        except re.error as e:
+            raise UnsupportedQuery(f"Invalid $regex {pattern!r}: {e}")
+
+        candidates = self._regex_candidates(field, pattern, flags)
+        if candidates is not None:
+            ids = ids & candidates
+        # Token lookups only narrow the set, the compiled regex is the source of truth
+        return {
+            i for i in ids
+            if isinstance(self.docs[i].get(field), str) and compiled.search(self.docs[i][field])
+        }
+
+    def _regex_candidates(self, field, pattern, flags):
+        """
+        For an alternation of plain words ("business|administration|mba") returns the ids
+        whose tokens contain any of the words, otherwise None (no pruning possible).
+        """
+        index = self.token_index.get(field)
+        if index is None or not flags & re.IGNORECASE:
+            return None
+        words = pattern.lower().split('|')
+        if not all(_plain_word_re.match(word) for word in words):
+            return None
+        candidates = set()
+        for word in words:
+            for token, postings in index.items():
+                if word in token:
+                    candidates.update(postings)
+        return candidates
+
+    def _match_range(self, field, op, bound, ids):
+        if not _is_number(bound):
+            raise UnsupportedQuery(f"Non-numeric bound for {op} on {field}")
+        if field not in self.numeric_index:
+            compare = {
+                '$lt': lambda v: v < bound, '$lte': lambda v: v <= bound,
+                '$gt': lambda v: v > bound, '$gte': lambda v: v >= bound,
+            }[op]
+            return {i for i in ids if _is_number(self.docs[i].get(field)) and compare(self.docs[i][field])}
+
+        values, order = self.numeric_index[field]
+        if op == '$lt':
+            matched = order[:bisect.bisect_left(values, bound)]
+        elif op == '$lte':
+            matched = order[:bisect.bisect_right(values, bound)]
+        elif op == '$gt':
+            matched = order[bisect.bisect_right(values, bound):]
+        else:
+            matched = order[bisect.bisect_left(values, bound):]
+        return ids & set(matched)
+
+
+_missing = object()
+
+
+class _Row(Mapping):
+    """One program of a CatalogFile, decoded field by field as the filters touch it."""
+
+    __slots__ = ('_file', '_i')
+
+    def __init__(self, catalog_file, i):
+        self._file = catalog_file
+        self._i = i
+
+    def __getitem__(self, field):
+        value = self._file.value(self._i, field, _missing)
+        if value is _missing:
+            raise KeyError(field)
+        return value
+
+    def get(self, field, default=None):
+        return self._file.value(self._i, field, default)
+
+    def __iter__(self):
+        return (field for field in self._file.columns if field in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class _Rows(Sequence):
+    def __init__(self, catalog_file):
+        self._file = catalog_file
+
+    def __len__(self):
+        return self._file.count
+
+    def __getitem__(self, i):
+        if not 0 <= i < self._file.count:
+            raise IndexError(i)
+        return _Row(self._file, i)
+
+
+class MappedCatalog(ProgramCatalog):
+    """
+    ProgramCatalog over a memory-mapped CatalogFile: the columns and indexes live in the
+    page cache, shared with every other worker that maps the same file.
+    """
+
+    def __init__(self, catalog_file):
+        self.file = catalog_file
+        self.docs = _Rows(catalog_file)
+        self.loaded_at = catalog_file.built_at
+        self.all_ids = frozenset(range(catalog_file.count))
+        self.token_index = {}
+        self.field_lengths = {}
+        self.terms = {}
+        for field in TEXT_FIELDS:
+            index = catalog_file.token_index(field)
+            if index is not None:
+                self.token_index[field] = index
+                self.field_lengths[field] = index.lengths
+                self.terms[field] = index.terms
+        self.average_lengths = _average_lengths(self.field_lengths)
+        self._number_columns = {}
+        self.numeric_index = {}
+        for field in NUMERIC_FIELDS:
+            index = catalog_file.numeric_index(field)
+            if index is not None:
+                self.numeric_index[field] = index
+
+    def postings(self, field, term):
+        return self.token_index[field].counts_of(term)
+
+    def number_column(self, field):
+        column = self.file.columns.get(field)
+        if column is not None and column[0] == 'number':
+            return column[2]
+        return super().number_column(field)
+
+
+_catalog = None
+
+
+def get_catalog():
+    return _catalog
+
+
+def _shared():
+    return bool(CATALOG_FILE) and fcntl is not None
+
+
+def _build_catalog_file(docs):
+    write_catalog_file(CATALOG_FILE, docs, TEXT_FIELDS, NUMERIC_FIELDS, tokenize)
+    return MappedCatalog(CatalogFile(CATALOG_FILE))
+
+
+async def load_catalog(collection):
+    global _catalog
+    started = time.perf_counter()
+    docs = await collection.find({}).to_list(None)
+    if _shared():
+        _catalog = await asyncio.to_thread(_build_catalog_file, docs)
+    else:
+        _catalog = await asyncio.to_thread(ProgramCatalog, docs)
+    logger.info(f"Loaded program catalog snapshot: {len(docs)} programs in {time.perf_counter() - started:.3f}s")
+    return _catalog
+
+
+def _map_catalog_file():
+    """Switches to the shared catalog file when another worker has rebuilt it."""
+    global _catalog
+    try:
+        stat = os.stat(CATALOG_FILE)
+    except FileNotFoundError:
+        return
+    if isinstance(_catalog, MappedCatalog) and _catalog.file.identity == (stat.st_ino, stat.st_mtime_ns):
+        return
+    try:
+        # The previous mapping is released once the requests still using it are done
+        _catalog = MappedCatalog(CatalogFile(CATALOG_FILE))
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not map the shared program catalog: {e}")
+        return
+    logger.info(f"Mapped shared program catalog: {len(_catalog)} programs built at {_catalog.loaded_at:.0f}")
+
+
+async def _refresh_on_changes(collection):
+    async with collection.watch() as stream:
+        async for _ in stream:
+            # Drain bursts of changes (bulk imports) into a single reload
+            while stream.alive and await stream.try_next() is not None:
+                pass
+            await load_catalog(collection)
+
+
+async def run_catalog_refresher(collection):
+    """
+    Keeps the catalog fresh. With CATALOG_FILE, the worker holding the file lock is the
+    only one reading Mongo and rebuilding the file; the others map whatever it last wrote
+    and take over the lock if that worker goes away.
+    """
+    if not _shared():
+        await _keep_fresh(collection)
+        return
+
+    with open(f"{CATALOG_FILE}.lock", 'a') as lock:
+        while True:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                _map_catalog_file()
+                await asyncio.sleep(CATALOG_FILE_POLL_SECONDS)
+                continue
+            logger.info(f"This worker (pid {os.getpid()}) refreshes the shared program catalog")
+            await _keep_fresh(collection)
+
+
+async def _keep_fresh(collection):
+    """
+    Loads the snapshot, then keeps it fresh from a change stream when the deployment
+    supports one, falling back to a reload every CATALOG_REFRESH_SECONDS.
+    """
+    while True:
+        try:
+            await load_catalog(collection)
+            break
+        except Exception as e:
+            logger.error(f"Program catalog load failed: {e}")
+            await asyncio.sleep(5)
+
+    if CATALOG_USE_CHANGE_STREAM:
+        try:
+            await _refresh_on_changes(collection)
+        except OperationFailure as e:
+            logger.info(f"Change streams unavailable ({e}), refreshing the catalog on a timer")
+        except Exception as e:
+            logger.error(f"Catalog change stream failed: {e}, refreshing the catalog on a timer")
+
+    while True:
+        await asyncio.sleep(CATALOG_REFRESH_SECONDS)
+        try:
+            await load_catalog(collection)
+        except Exception as e:
+            logger.error(f"Program catalog refresh failed: {e}")
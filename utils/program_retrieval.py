@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import math
+import os
+
+from utils import admission
+from utils.database import get_programs_collection
+from utils.metrics import stage
+from utils.program_catalog import UnsupportedQuery, get_catalog
+from utils.program_search import search
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', 5))
+RESULT_TOKEN_BUDGET = int(os.getenv('RESULT_TOKEN_BUDGET', 600))
+
+# Only the fields an answer actually uses; no _id, no curriculum links
+PROGRAM_FIELDS = (
+    'program_name', 'location', 'public_private', 'type_of_program', 'glovera_pricing',
+    'original_pricing', 'savings_percent', 'min_gpa', 'ranking', 'key_job_roles',
+)
+PROGRAM_PROJECTION = dict({'_id': 0}, **{field: 1 for field in PROGRAM_FIELDS})
+
+SORT_OPTIONS = ('ranking', 'savings', 'price', 'price_fit', 'fit')
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English text, good enough for budgeting
+    return len(text) // 4 + 1
+
+
+def _number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and not math.isnan(value):
+        return value
+    return None
+
+
+def _local_sort_key(sort_by, max_budget):
+    # Missing values always sort last
+    def key(doc):
+        if sort_by == 'savings':
+            value = _number(doc.get('savings_percent'))
+            return (value is None, -(value or 0))
+        price = _number(doc.get('glovera_pricing'))
+        if sort_by == 'price_fit' and max_budget is not None:
+            return (price is None, abs(max_budget - (price or 0)))
+        if sort_by in ('price', 'price_fit'):
+            return (price is None, price or 0)
+        ranking = _number(doc.get('ranking'))
+        return (ranking is None, ranking or 0)
+    return key
+
+
+def _project(doc):
+    return {f: doc[f] for f in PROGRAM_FIELDS if f in doc}
+
+
+def _mongo_pipeline(query_filter, sort_by, max_budget, k):
+    pipeline = [{'$match': query_filter}]
+    if sort_by == 'price_fit' and max_budget is not None:
+        pipeline.append({'$addFields': {'_fit': {'$abs': {'$subtract': [max_budget, '$glovera_pricing']}}}})
+        sort_field, direction = '_fit', 1
+    else:
+        sort_field, direction = {
+            'savings': ('savings_percent', -1),
+            'price': ('glovera_pricing', 1),
+            'price_fit': ('glovera_pricing', 1),
+        }.get(sort_by, ('ranking', 1))
+    # Push documents missing the sort field to the end, Mongo sorts null first otherwise
+    pipeline += [
+        {'$addFields': {'_missing': {'$cond': [{'$isNumber': f'${sort_field}'}, 0, 1]}}},
+        {'$sort': {'_missing': 1, sort_field: direction}},
+        {'$limit': k},
+        {'$project': PROGRAM_PROJECTION},
+    ]
+    return pipeline
+
+
+async def retrieve_programs(query_filter, sort_by='ranking', max_budget=None, gpa=None, k=RETRIEVAL_TOP_K):
+    """
+    Returns (total matches, top-k projected programs) for a Mongo filter, using the
+    in-process catalog when it can evaluate the filter and Mongo otherwise.
+    sort_by='fit' ranks by fit to `max_budget` and `gpa` (utils/program_scoring.py), which
+    only order the matches: the filter alone decides what matches and how many, on both
+    the catalog and the Mongo path (which falls back to ranking order for 'fit').
+    """
+    if sort_by not in SORT_OPTIONS:
+        sort_by = 'ranking'
+
+    catalog = get_catalog()
+    if catalog is not None:
+        try:
+            with stage("catalog_retrieval", sort_by=sort_by) as fields:
+                ids = catalog.match_ids(query_filter)
+                fields["matches"] = len(ids)
+                if sort_by == 'fit':
+                    # numpy is only imported once scoring is needed, not at worker start
+                    from utils.program_scoring import rank_by_fit
+                    total, best = rank_by_fit(catalog, ids, max_budget, gpa, k)
+                    return total, [_project(catalog.docs[i]) for i in best]
+                docs = sorted((catalog.docs[i] for i in ids), key=_local_sort_key(sort_by, max_budget))[:k]
+            return len(ids), [_project(doc) for doc in docs]
+        except UnsupportedQuery as e:
+            logger.info(f"catalog fallback: {e}")
+
+    collection = get_programs_collection()
+    async with admission.mongo.slot():
+        with stage("mongo_retrieval", sort_by=sort_by) as fields:
+            total, docs = await asyncio.gather(
+                collection.count_documents(query_filter),
+                collection.aggregate(_mongo_pipeline(query_filter, sort_by, max_budget, k)).to_list(k),
+            )
+            fields["matches"] = total
+    return total, docs
+
+
+def search_catalog(text, query_filter=None, k=RETRIEVAL_TOP_K):
+    """
+    Returns (total matches, top-k projected programs) for a free-text query ranked by
+    BM25 relevance, restricted to `query_filter` when given, or None when the
+    in-process catalog can't answer (not loaded yet, or a filter it can't evaluate).
+    """
+    catalog = get_catalog()
+    if catalog is None:
+        return None
+    try:
+        with stage("catalog_search") as fields:
+            candidates = catalog.match_ids(query_filter) if query_filter else None
+            total, ranked = search(catalog, text, candidates, k)
+            fields["matches"] = total
+    except UnsupportedQuery as e:
+        logger.info(f"catalog search unavailable: {e}")
+        return None
+    return total, [_project(catalog.docs[i]) for i, _ in ranked]
+
+
+def _format_program(rank, doc):
+    parts = [str(doc.get('program_name', 'Unknown program'))]
+    if doc.get('location'):
+        parts.append(str(doc['location']))
+    if doc.get('public_private'):
+        parts.append(str(doc['public_private']))
+    price = _number(doc.get('glovera_pricing'))
+    if price is not None:
+        pricing = f"${price:,.0f}"
+        original = _number(doc.get('original_pricing'))
+        savings = _number(doc.get('savings_percent'))
+        if original is not None and savings:
+            pricing += f" (was ${original:,.0f}, save {savings:g}%)"
+        parts.append(pricing)
+    if _number(doc.get('ranking')) is not None:
+        parts.append(f"rank {doc['ranking']}")
+    if _number(doc.get('min_gpa')) is not None:
+        parts.append(f"min GPA {doc['min_gpa']}")
+    if doc.get('key_job_roles'):
+        roles = str(doc['key_job_roles'])
+        parts.append(f"roles: {roles[:80]}{'...' if len(roles) > 80 else ''}")
+    return f"{rank}. " + " | ".join(parts)
+
+
+def render_programs(total, docs, sort_by='ranking', token_budget=RESULT_TOKEN_BUDGET):
+    """
+    Compact one-line-per-program rendering of the top results, cut off at `token_budget`.
+    """
+    if not total:
+        return "Found 0 matching programs."
+    lines = [f"Found {total} matching programs, top {len(docs)} by {sort_by}:"]
+    used = estimate_tokens(lines[0])
+    for rank, doc in enumerate(docs, start=1):
+        line = _format_program(rank, doc)
+        cost = estimate_tokens(line)
+        if used + cost > token_budget:
+            lines.append(f"(+{len(docs) - rank + 1} more not shown)")
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines)
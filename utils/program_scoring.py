@@ -0,0 +1,73 @@
+"""
+Profile-fit scoring over the catalog's numeric columns: budget fit, GPA margin,
+ranking and savings are computed for every candidate program at once with NumPy and the
+best k are picked with argpartition, so the model gets ranked candidates, not raw rows.
+"""
+import os
+
+import numpy as np
+
+# Weight of each component in the fit score, every component being in [0, 1]
+FIT_WEIGHTS = {'budget': 0.4, 'gpa': 0.2, 'ranking': 0.3, 'savings': 0.1}
+# Budget fit falls from 1 at the max budget to 0 this fraction above it
+FIT_BUDGET_STRETCH = float(os.getenv('FIT_BUDGET_STRETCH', 0.1))
+# GPA points above a program's minimum at which the GPA component is full
+FIT_GPA_MARGIN = 0.5
+
+
+def _column(catalog, field):
+    return np.frombuffer(catalog.number_column(field), dtype=np.float64)
+
+
+def fit_scores(catalog, max_budget=None, gpa=None, positions=None):
+    """
+    Fit score per program, or per entry of `positions` (program ids) when given. Nothing
+    is excluded here: eligibility is the query filter's job, a program over budget or
+    above the student's GPA just scores 0 on that component.
+    """
+    price = _column(catalog, 'glovera_pricing')
+    min_gpa = _column(catalog, 'min_gpa')
+    ranking = _column(catalog, 'ranking')
+    savings = _column(catalog, 'savings_percent')
+    # Normalise ranking against the whole catalog, not just the candidates
+    worst_rank = np.nanmax(ranking) if len(ranking) and not np.isnan(ranking).all() else 1.0
+    if positions is not None:
+        price, min_gpa, ranking, savings = price[positions], min_gpa[positions], ranking[positions], savings[positions]
+
+    score = np.zeros(len(price))
+    with np.errstate(invalid='ignore'):
+        if max_budget:
+            over = (price - max_budget) / max_budget
+            budget_fit = np.clip(1 - over / max(FIT_BUDGET_STRETCH, 1e-9), 0, 1)
+            score += FIT_WEIGHTS['budget'] * np.nan_to_num(budget_fit, nan=0.5)
+        if gpa is not None:
+            margin = np.clip((gpa - min_gpa) / FIT_GPA_MARGIN, 0, 1)
+            score += FIT_WEIGHTS['gpa'] * np.nan_to_num(margin, nan=1.0)
+        rank_fit = np.clip(1 - (ranking - 1) / max(worst_rank, 1.0), 0, 1)
+        score += FIT_WEIGHTS['ranking'] * np.nan_to_num(rank_fit, nan=0.0)
+        score += FIT_WEIGHTS['savings'] * np.nan_to_num(np.clip(savings / 100, 0, 1), nan=0.0)
+    return score
+
+
+def top_k(scores, k):
+    """Positions of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best], kind='stable')]
+
+
+def rank_by_fit(catalog, ids=None, max_budget=None, gpa=None, k=5):
+    """
+    Returns (number of programs scored, best k program ids) among `ids` (a set from
+    catalog.match_ids, or the whole catalog when None).
+    """
+    positions = None
+    if ids is not None:
+        positions = np.fromiter(sorted(ids), dtype=np.intp, count=len(ids))
+    scores = fit_scores(catalog, max_budget, gpa, positions)
+    best = top_k(scores, k)
+    if positions is not None:
+        best = positions[best]
+    return len(scores), best.tolist()
@@ -0,0 +1,160 @@
+"""
+BM25 relevance search over the program catalog's token indexes, for free-text questions
+that would otherwise go through a hand-written `$regex` alternation and a full scan.
+"""
+import heapq
+import math
+import os
+
+from utils.program_catalog import tokenize
+
+# Field weights in the combined score: a hit in the name counts more than one in the job roles
+SEARCH_FIELDS = {'program_name': 1.0, 'type_of_program': 1.0, 'location': 0.8, 'key_job_roles': 0.6}
+
+BM25_K1 = float(os.getenv('BM25_K1', 1.2))
+BM25_B = float(os.getenv('BM25_B', 0.75))
+# Query terms that come from a synonym or only match an indexed term as a prefix count less
+SYNONYM_WEIGHT = 0.7
+PREFIX_WEIGHT = 0.5
+MIN_PREFIX_LENGTH = 4
+MAX_PREFIX_TERMS = 20
+
+STOPWORDS = frozenset((
+    'a', 'an', 'and', 'any', 'are', 'at', 'best', 'by', 'can', 'do', 'find', 'for', 'from', 'give',
+    'good', 'i', 'in', 'is', 'me', 'my', 'of', 'on', 'or', 'program', 'programs', 'show', 'some',
+    'that', 'the', 'to', 'university', 'universities', 'want', 'what', 'which', 'with',
+))
+
+# Each group lists interchangeable spellings; a phrase in a query pulls in the other phrases
+SYNONYM_GROUPS = (
+    ('mba', 'business administration'),
+    ('ms', 'msc', 'master of science'),
+    ('ma', 'master of arts'),
+    ('meng', 'master of engineering'),
+    ('masters', 'master'),
+    ('cs', 'computer science'),
+    ('ai', 'artificial intelligence'),
+    ('ml', 'machine learning'),
+    ('ds', 'data science'),
+    ('it', 'information technology'),
+    ('swe', 'software engineer', 'software engineering'),
+    ('ee', 'electrical engineering'),
+    ('mech', 'mechanical engineering'),
+    ('scm', 'supply chain management'),
+    ('cybersecurity', 'cyber security', 'information security'),
+    ('tx', 'texas'),
+    ('ca', 'california'),
+    ('ny', 'nyc', 'new york'),
+    ('il', 'illinois'),
+    ('wa', 'washington'),
+    ('ga', 'georgia'),
+    ('pa', 'pennsylvania'),
+    ('az', 'arizona'),
+    ('nj', 'new jersey'),
+    ('fl', 'florida'),
+    ('sf', 'bay area', 'san francisco', 'san jose'),
+    ('la', 'los angeles'),
+)
+
+
+def _synonym_table():
+    table = {}
+    for group in SYNONYM_GROUPS:
+        phrases = [tuple(tokenize(phrase)) for phrase in group]
+        for phrase in phrases:
+            table.setdefault(phrase, []).extend(other for other in phrases if other != phrase)
+    return table
+
+
+_synonyms = _synonym_table()
+_longest_synonym = max(len(phrase) for phrase in _synonyms)
+
+
+def expand_query(text):
+    """
+    Returns {term: weight} for a free-text query: its own tokens (minus stopwords) at
+    weight 1 and the tokens of their synonyms at SYNONYM_WEIGHT.
+    """
+    tokens = tokenize(text)
+    terms = {}
+    for n in range(1, _longest_synonym + 1):
+        for start in range(len(tokens) - n + 1):
+            for phrase in _synonyms.get(tuple(tokens[start:start + n]), ()):
+                for token in phrase:
+                    if token not in STOPWORDS:
+                        terms[token] = max(terms.get(token, 0), SYNONYM_WEIGHT)
+    for token in tokens:
+        if token not in STOPWORDS:
+            terms[token] = 1.0
+    return terms
+
+
+def _index_terms(catalog, field, term):
+    """Indexed terms a query term matches, with a weight: itself, then longer words it starts."""
+    yield term, 1.0
+    if len(term) < MIN_PREFIX_LENGTH:
+        return
+    for k, indexed in enumerate(catalog.terms_with_prefix(field, term)):
+        if k >= MAX_PREFIX_TERMS:
+            break
+        if indexed != term:
+            yield indexed, PREFIX_WEIGHT
+
+
+def _idf(count, df):
+    return math.log(1 + (count - df + 0.5) / (df + 0.5))
+
+
+def search(catalog, text, candidates=None, k=5):
+    """
+    Scores programs against `text` with BM25 per field (weighted by SEARCH_FIELDS) and
+    returns (number of programs that matched, [(program id, score)] best first).
+    `candidates` restricts the search to a set of ids, e.g. catalog.match_ids(filter).
+    """
+    terms = expand_query(text)
+    count = len(catalog)
+    scores = {}
+    if not terms or not count:
+        return 0, []
+
+    for field, field_weight in SEARCH_FIELDS.items():
+        if field not in catalog.token_index:
+            continue
+        lengths = catalog.field_lengths[field]
+        # BM25 length normalisation k1 * (1 - b + b * length / average), split into its two terms
+        base = BM25_K1 * (1 - BM25_B)
+        per_token = BM25_K1 * BM25_B / (catalog.average_lengths[field] or 1.0)
+        for term, term_weight in terms.items():
+            for indexed, match_weight in _index_terms(catalog, field, term):
+                postings = list(catalog.postings(field, indexed))
+                if not postings:
+                    continue
+                weight = field_weight * term_weight * match_weight * _idf(count, len(postings)) * (BM25_K1 + 1)
+                for i, occurrences in postings:
+                    if candidates is not None and i not in candidates:
+                        continue
+                    score = weight * occurrences / (occurrences + base + per_token * lengths[i])
+                    scores[i] = scores.get(i, 0.0) + score
+
+    # Equal scores keep catalog order so results are stable across calls
+    top = heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+    return len(scores), top
+
+
+# Words a question can be made of and still only ask "what fits me": anything else (a
+# university, a field, "private", a number) is a constraint of its own
+GENERIC_WORDS = frozenset((
+    'about', 'afford', 'affordable', 'apply', 'based', 'budget', 'could', 'course', 'courses',
+    'eligible', 'fit', 'fits', 'get', 'gpa', 'into', 'match', 'matches', 'option', 'options',
+    'profile', 'recommend', 'recommendation', 'recommendations', 'should', 'suit', 'suitable',
+    'suits', 'tell', 'within', 'would', 'you', 'your',
+))
+
+
+def is_generic_question(text):
+    """
+    True when every word of `text` is a stopword or in GENERIC_WORDS ("what programs suit
+    me?"), so the only filters that apply to it are the student's own profile.
+    """
+    tokens = tokenize(text)
+    return bool(tokens) and all(token in STOPWORDS or token in GENERIC_WORDS for token in tokens)
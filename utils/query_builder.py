@@ -0,0 +1,110 @@
+import math
+import re
+
+PUBLIC_PRIVATE = ('public', 'private')
+MAX_KEYWORDS = 12
+MAX_TEXT_LENGTH = 60
+# Accepted range of each numeric argument
+NUMBER_RANGES = {'max_budget': (0, 10_000_000), 'gpa': (0, 10)}
+
+
+class InvalidToolArguments(ValueError):
+    pass
+
+
+def _text(value, name):
+    if not isinstance(value, str) or not value.strip():
+        raise InvalidToolArguments(f"{name} must be a non-empty string")
+    value = value.strip().lower()
+    if len(value) > MAX_TEXT_LENGTH:
+        raise InvalidToolArguments(f"{name} is longer than {MAX_TEXT_LENGTH} characters")
+    return value
+
+
+def _number(value, name, low, high):
+    if isinstance(value, str):
+        try:
+            value = float(value.replace(',', '').replace('$', ''))
+        except ValueError:
+            raise InvalidToolArguments(f"{name} must be a number")
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or math.isnan(value):
+        raise InvalidToolArguments(f"{name} must be a number")
+    if not low <= value <= high:
+        raise InvalidToolArguments(f"{name} must be between {low} and {high}")
+    return value
+
+
+def _alternation(words):
+    # Escaped literals only: nothing the model sends is interpreted as a regex
+    return "|".join(re.escape(word) for word in words)
+
+
+def _keywords(value, name):
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not value:
+        raise InvalidToolArguments(f"{name} must be a list of strings")
+    if len(value) > MAX_KEYWORDS:
+        raise InvalidToolArguments(f"{name} accepts at most {MAX_KEYWORDS} entries")
+    return [_text(word, name) for word in value]
+
+
+def compile_filter(arguments, defaults=None):
+    """
+    Validates structured search_programs arguments and compiles them into a Mongo
+    filter of the same shape ask_db_agent produces. `defaults` fills max_budget/gpa
+    from the user's profile when the model didn't pass them; a default that doesn't
+    validate (e.g. a percentage GPA) is left out rather than failing the search.
+    """
+    arguments = dict(arguments)
+    for key, value in (defaults or {}).items():
+        if arguments.get(key) is not None:
+            continue
+        try:
+            arguments[key] = _number(value, key, *NUMBER_RANGES[key]) if key in NUMBER_RANGES else value
+        except InvalidToolArguments:
+            continue
+
+    clauses = []
+    if arguments.get('keywords'):
+        pattern = _alternation(_keywords(arguments['keywords'], 'keywords'))
+        clauses.append({"$or": [
+            {field: {"$regex": pattern, "$options": "i"}}
+            for field in ('program_name', 'type_of_program', 'key_job_roles')
+        ]})
+    if arguments.get('program_type'):
+        clauses.append({"type_of_program": {"$regex": re.escape(_text(arguments['program_type'], 'program_type')), "$options": "i"}})
+    if arguments.get('location'):
+        clauses.append({"location": {"$regex": _alternation(_keywords(arguments['location'], 'location')), "$options": "i"}})
+    if arguments.get('max_budget') is not None:
+        clauses.append({"glovera_pricing": {"$lte": _number(arguments['max_budget'], 'max_budget', *NUMBER_RANGES['max_budget'])}})
+    if arguments.get('gpa') is not None:
+        clauses.append({"min_gpa": {"$lte": _number(arguments['gpa'], 'gpa', *NUMBER_RANGES['gpa'])}})
+    if arguments.get('public_private'):
+        kind = _text(arguments['public_private'], 'public_private')
+        if kind not in PUBLIC_PRIVATE:
+            raise InvalidToolArguments("public_private must be 'public' or 'private'")
+        clauses.append({"public_private": {"$regex": kind, "$options": "i"}})
+
+    return {"$and": clauses} if clauses else {}
+
+
+def upper_bound(query_filter, field):
+    """
+    The tightest `$lte`/`$lt` a filter puts on `field` at its top level or inside `$and`,
+    e.g. the budget a question asked for, or None when it sets none.
+    """
+    bounds = []
+    clauses = [query_filter]
+    while clauses:
+        clause = clauses.pop()
+        if not isinstance(clause, dict):
+            continue
+        clauses.extend(clause.get('$and') or [])
+        condition = clause.get(field)
+        if isinstance(condition, dict):
+            bounds.extend(
+                value for op, value in condition.items()
+                if op in ('$lte', '$lt') and isinstance(value, (int, float)) and not isinstance(value, bool)
+            )
+    return min(bounds) if bounds else None
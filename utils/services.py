@@ -0,0 +1,84 @@
+import asyncio
+import importlib
+import logging
+import os
+import threading
+import time
+
+from utils.database import ping_db
+
+logger = logging.getLogger(__name__)
+
+# Worker boot, from process start to the app accepting requests, should stay under this
+STARTUP_BUDGET_SECONDS = float(os.getenv('STARTUP_BUDGET_SECONDS', 1.0))
+READY_PING_TIMEOUT_SECONDS = float(os.getenv('READY_PING_TIMEOUT_SECONDS', 1.0))
+
+# SDK clients shared by every module, built on first use: importing openai/groq alone is
+# a good part of a cold start, so it happens in warm_up() after the worker is serving
+_openai = None
+_groq = None
+_lock = threading.Lock()
+
+startup_seconds = None
+
+
+def openai_client():
+    global _openai
+    if _openai is None:
+        with _lock:
+            if _openai is None:
+                from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+                from llm import cassette
+                _openai = AsyncOpenAI(http_client=cassette.http_client("openai", DefaultAsyncHttpxClient))
+    return _openai
+
+
+def groq_client():
+    global _groq
+    if _groq is None:
+        with _lock:
+            if _groq is None:
+                from groq import AsyncGroq, DefaultAsyncHttpxClient
+                from llm import cassette
+                _groq = AsyncGroq(http_client=cassette.http_client("groq", DefaultAsyncHttpxClient))
+    return _groq
+
+
+async def warm_up():
+    """Builds the SDK clients, loads numpy and opens a first Mongo connection off the request path."""
+    started = time.perf_counter()
+    await asyncio.to_thread(openai_client)
+    await asyncio.to_thread(groq_client)
+    # Loads numpy for profile-fit scoring
+    await asyncio.to_thread(importlib.import_module, 'utils.program_scoring')
+    await ping_db(READY_PING_TIMEOUT_SECONDS)
+    logger.info(f"Services warmed up in {time.perf_counter() - started:.3f}s")
+
+
+def mark_started(boot_started):
+    """Records how long the worker took to start, `boot_started` being a perf_counter() taken at process start."""
+    global startup_seconds
+    startup_seconds = time.perf_counter() - boot_started
+    if startup_seconds > STARTUP_BUDGET_SECONDS:
+        logger.warning(f"Startup took {startup_seconds:.3f}s, over the {STARTUP_BUDGET_SECONDS}s budget")
+    else:
+        logger.info(f"Startup took {startup_seconds:.3f}s")
+
+
+async def readiness():
+    mongo = await ping_db(READY_PING_TIMEOUT_SECONDS)
+    return {
+        "ready": mongo,
+        "mongo": mongo,
+        "openai_client": _openai is not None,
+        "groq_client": _groq is not None,
+        "startup_seconds": startup_seconds,
+    }
+
+
+async def close():
+    global _openai, _groq
+    for client in (_openai, _groq):
+        if client is not None:
+            await client.close()
+    _openai = _groq = None
@@ -0,0 +1,72 @@
+import os
+
+from utils.cache import TTLCache
+
+SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', 2048))
+SESSION_CACHE_TTL_SECONDS = float(os.getenv('SESSION_CACHE_TTL_SECONDS', 300))
+SESSION_TAIL_MESSAGES = int(os.getenv('CONVERSATION_TAIL_MESSAGES', 40))
+
+# conversation_id -> conversation tail as returned by api._find_conversation_with_profile
+conversations = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL_SECONDS)
+# userId (str) -> Profile document
+profiles = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL_SECONDS)
+
+
+def get_session(conversation_id):
+    """
+    Returns (conversation, profile) for a hot session, or None when either part is
+    missing or expired so the caller does one combined lookup.
+    """
+    conversation = conversations.get(conversation_id)
+    if conversation is None:
+        return None
+    profile = profiles.get(str(conversation['userId']))
+    if profile is None:
+        return None
+    return conversation, profile
+
+
+def put_session(conversation_id, conversation, profile):
+    conversations.set(conversation_id, conversation)
+    if profile is not None:
+        profiles.set(str(conversation['userId']), profile)
+
+
+def append_messages(conversation_id, messages):
+    """
+    Write-through for a saved turn: extends the cached tail and keeps it at the same
+    size the database read would return.
+    """
+    conversation = conversations.get(conversation_id)
+    if conversation is None:
+        return
+    tail = conversation['messages'] + list(messages)
+    conversation['messageCount'] = conversation.get('messageCount', 0) + len(messages)
+
+    system = tail[0] if conversation.get('historyBase') and tail and tail[0]['role'] == 'system' else None
+    history = tail[1:] if system else tail
+    overflow = len(history) - SESSION_TAIL_MESSAGES
+    if overflow > 0:
+        history = history[overflow:]
+        conversation['historyOffset'] = conversation.get('historyOffset', 0) + overflow
+    conversation['messages'] = ([system] if system else []) + history
+    conversations.set(conversation_id, conversation)
+
+
+def update_summary(conversation_id, summary, summarized_count):
+    conversation = conversations.get(conversation_id)
+    if conversation is not None:
+        conversation['summary'] = summary
+        conversation['summarizedCount'] = summarized_count
+
+
+def invalidate_session(conversation_id):
+    conversations.pop(conversation_id)
+
+
+def invalidate_profile(user_id):
+    profiles.pop(str(user_id))
+
+
+def stats():
+    return {"conversations": conversations.stats(), "profiles": profiles.stats()}
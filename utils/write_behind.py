@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import os
+
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
+
+from utils.admission import Overloaded
+from utils.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# 'sync' writes on the request path, 'write_behind' queues writes and flushes them in batches
+PERSIST_MODE = os.getenv('PERSIST_MODE', 'sync')
+WRITE_BEHIND_QUEUE_SIZE = int(os.getenv('WRITE_BEHIND_QUEUE_SIZE', 10000))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv('WRITE_BEHIND_BATCH_SIZE', 200))
+WRITE_BEHIND_FLUSH_MS = float(os.getenv('WRITE_BEHIND_FLUSH_MS', 50))
+WRITE_BEHIND_MAX_RETRIES = int(os.getenv('WRITE_BEHIND_MAX_RETRIES', 3))
+# Durability knob for flushed batches: "0", "1" or "majority"
+WRITE_BEHIND_WRITE_CONCERN = os.getenv('WRITE_BEHIND_WRITE_CONCERN', '1')
+WRITE_BEHIND_DRAIN_SECONDS = float(os.getenv('WRITE_BEHIND_DRAIN_SECONDS', 10))
+# How long submit() waits for room in a full queue before turning the request away
+WRITE_BEHIND_ENQUEUE_TIMEOUT_SECONDS = float(os.getenv('WRITE_BEHIND_ENQUEUE_TIMEOUT_SECONDS', 5))
+# Duplicate key: an insert that an earlier, ambiguous attempt already applied
+_DUPLICATE_KEY = 11000
+
+_STOP = object()
+
+
+def _write_concern():
+    w = WRITE_BEHIND_WRITE_CONCERN
+    return WriteConcern(w=int(w) if w.isdigit() else w)
+
+
+class WriteBehindQueue:
+    """
+    Bounded in-process queue of write operations for one collection, flushed with
+    ordered bulk_write batches so each conversation's writes land in submission order.
+    A full queue makes submit() wait (Overloaded after WRITE_BEHIND_ENQUEUE_TIMEOUT_SECONDS)
+    rather than write around it, which could overtake the conversation's queued writes.
+    submit() returns False only when the flusher isn't running; callers then write synchronously.
+    Batches are retried after ambiguous failures, so queued ops must be idempotent.
+    """
+
+    def __init__(self, maxsize=WRITE_BEHIND_QUEUE_SIZE, batch_size=WRITE_BEHIND_BATCH_SIZE,
+                 flush_ms=WRITE_BEHIND_FLUSH_MS):
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._collection = None
+        self._task = None
+        self.submitted = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.batches = 0
+        self.failed = 0
+        self.waited = 0
+        self.unconfirmed = 0
+
+    @property
+    def enabled(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self, collection):
+        self._collection = collection.with_options(write_concern=_write_concern())
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, op):
+        if not self.enabled:
+            return False
+        if self._queue.full():
+            self.waited += 1
+            try:
+                await asyncio.wait_for(self._queue.put(op), WRITE_BEHIND_ENQUEUE_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise Overloaded("write_behind", "queue_full")
+        else:
+            self._queue.put_nowait(op)
+        self.submitted += 1
+        return True
+
+    async def stop(self, timeout=WRITE_BEHIND_DRAIN_SECONDS):
+        """Flushes everything still queued, then stops the flusher."""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Write-behind drain timed out with {self._queue.qsize()} operations left")
+            self._task.cancel()
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            op = await self._queue.get()
+            if op is _STOP:
+                break
+            batch = [op]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    op = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if op is _STOP:
+                    stopping = True
+                    break
+                batch.append(op)
+            await self._flush_safely(batch)
+
+        # Drain whatever was queued behind the stop marker
+        remaining = []
+        while not self._queue.empty():
+            op = self._queue.get_nowait()
+            if op is not _STOP:
+                remaining.append(op)
+        for i in range(0, len(remaining), self.batch_size):
+            await self._flush_safely(remaining[i:i + self.batch_size])
+
+    async def _flush_safely(self, batch):
+        # The flusher must outlive any batch: if it died, everything queued behind it would be lost
+        try:
+            await self._flush(batch)
+        except Exception as e:
+            logger.exception(f"Write-behind batch of {len(batch)} dropped: {e}")
+            self.failed += len(batch)
+
+    async def _flush(self, batch):
+        attempt = 0
+        while batch:
+            try:
+                with stage("write_behind_flush", ops=len(batch)):
+                    await self._collection.bulk_write(batch, ordered=True)
+                self.flushed += len(batch)
+                self.batches += 1
+                return
+            except BulkWriteError as e:
+                concern_errors = e.details.get('writeConcernErrors') or []
+                if concern_errors:
+                    # Applied, just not acknowledged at the requested write concern: not retried
+                    self.unconfirmed += 1
+                    logger.error(f"Write-behind batch not confirmed: {concern_errors[0].get('errmsg')}")
+                write_errors = e.details.get('writeErrors') or []
+                if not write_errors:
+                    self.flushed += len(batch)
+                    self.batches += 1
+                    return
+                # Ordered: everything before the first error was applied, skip the bad op and retry the rest
+                error = write_errors[0]
+                index = error['index']
+                if error.get('code') == _DUPLICATE_KEY:
+                    self.flushed += index + 1
+                else:
+                    logger.error(f"Write-behind operation dropped: {error.get('errmsg')}")
+                    self.flushed += index
+                    self.failed += 1
+                batch = batch[index + 1:]
+            except Exception as e:
+                # Part of the batch may have been applied; retrying is safe because every queued
+                # op is idempotent (inserts carry their _id, turn pushes are guarded)
+                attempt += 1
+                if attempt > WRITE_BEHIND_MAX_RETRIES:
+                    logger.error(f"Write-behind batch of {len(batch)} dropped after {attempt} attempts: {e}")
+                    self.failed += len(batch)
+                    return
+                await asyncio.sleep(0.1 * 2 ** attempt)
+
+    def stats(self):
+        return {
+            "mode": PERSIST_MODE,
+            "queued": self._queue.qsize(),
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "waited": self.waited,
+            "unconfirmed": self.unconfirmed,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "failed": self.failed,
+        }
+
+
+conversation_writes = WriteBehindQueue()